@@ -1,6 +1,13 @@
+import atexit
+import gzip
+import hashlib
+import io
+import json
 import os
 import sqlite3
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 from urllib.parse import quote
 
@@ -23,8 +30,26 @@ ACCOUNT_NO = os.getenv("ACCOUNT_NO", "0812810305").strip()
 
 DB_PATH = os.getenv("DB_PATH", "data.db")
 
+RESERVE_TTL_SEC = int(os.getenv("RESERVE_TTL_SEC", "900"))  # giữ hàng 15 phút
+STOCK_SWEEP_SEC = int(os.getenv("STOCK_SWEEP_SEC", "60"))  # 0 = tắt sweeper
+STOCK_CACHE_SEC = float(os.getenv("STOCK_CACHE_SEC", "10"))
+
+DELIVERY_POLL_SEC = float(os.getenv("DELIVERY_POLL_SEC", "5"))  # 0 = tắt worker giao hàng
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_DOC_CHARS = 3500  # quá dài thì gửi dạng file .txt
+
+MEDIA_DIR = os.getenv("MEDIA_DIR", "").strip()  # thư mục ảnh: START.jpg, CAT_TELE.png, ITEM_TELE_PACK.jpg...
+MEDIA_SCAN_SEC = float(os.getenv("MEDIA_SCAN_SEC", "60"))
+MEDIA_LEASE_SEC = 30.0  # hạn lease upload; được gia hạn liên tục khi upload còn chạy
+MEDIA_RETRY_SEC = 600.0  # upload lỗi (file hỏng/quá lớn, 429...) -> gửi không kèm ảnh, thử lại sau
+
+UPDATE_LOG_PATH = os.getenv("UPDATE_LOG_PATH", "").strip()  # ghi Update (ẩn danh) để replay/benchmark
+UPDATE_LOG_SALT = os.getenv("UPDATE_LOG_SALT", "").strip()  # cố định, để id ẩn danh giữ nguyên giữa các log
+
 if not BOT_TOKEN:
     raise RuntimeError("Missing BOT_TOKEN env var")
+if UPDATE_LOG_PATH and not UPDATE_LOG_SALT:
+    raise RuntimeError("UPDATE_LOG_PATH needs UPDATE_LOG_SALT env var")
 
 bot = telebot.TeleBot(BOT_TOKEN, threaded=False)
 server = Flask(__name__)
@@ -33,53 +58,929 @@ server = Flask(__name__)
 # DB (SQLite) - store image file_id by key
 # =========================
 def db_connect():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # durable at checkpoint instead of every commit; safe with WAL (see init_db)
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
-def init_db():
+def init_db():
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            key TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    # WAL: readers (kb_category) don't block the reservation writers of other workers
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS inventory (
+            item_id TEXT PRIMARY KEY,
+            available INTEGER NOT NULL DEFAULT 0 CHECK (available >= 0),
+            reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            qty INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            lang TEXT
+        )
+        """
+    )
+    # 1 user chỉ giữ 1 suất / sản phẩm tại một thời điểm
+    cur.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_reservations_held
+        ON reservations(item_id, user_id) WHERE status='HELD'
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS ix_reservations_status_exp ON reservations(status, expires_at)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_reservations_user ON reservations(user_id)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vault (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'NEW',
+            delivery_id INTEGER,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_vault_item_status ON vault(item_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_vault_delivery ON vault(delivery_id)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS deliveries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            qty INTEGER NOT NULL,
+            res_id INTEGER,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_try_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            lang TEXT
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_deliveries_status_next ON deliveries(status, next_try_at)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS delivery_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            delivery_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            detail TEXT,
+            at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_delivery_log_delivery ON delivery_log(delivery_id)")
+    # content_hash: sha256 of the MEDIA_DIR file the file_id was harvested from (NULL = /setimg)
+    _add_column(cur, "images", "content_hash", "TEXT")
+    # buyer's language, so deliveries are sent in it (DBs created before the column existed)
+    _add_column(cur, "reservations", "lang", "TEXT")
+    _add_column(cur, "deliveries", "lang", "TEXT")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_locks (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_prefs (
+            user_id INTEGER PRIMARY KEY,
+            lang TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def _add_column(cur, table: str, column: str, decl: str):
+    cols = {row["name"] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def set_image(key: str, file_id: str, content_hash=None):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO images(key, file_id, updated_at, content_hash)
+        VALUES(?,?,?,?)
+        ON CONFLICT(key) DO UPDATE SET
+            file_id=excluded.file_id, updated_at=excluded.updated_at, content_hash=excluded.content_hash
+        """,
+        (key.upper(), file_id, datetime.utcnow().isoformat(), content_hash),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_image_row(key: str):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT file_id, content_hash FROM images WHERE key=? LIMIT 1", (key.upper(),))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def get_image(key: str):
+    row = get_image_row(key)
+    return row["file_id"] if row else None
+
+
+# =========================
+# Media library (MEDIA_DIR -> lazy upload -> file_id)
+# A file is uploaded the first time its key is shown; the returned file_id
+# is stored with the file's sha256 and reused until the file changes.
+# One upload per key: a thread lock inside the worker, a lease row in
+# media_locks across gunicorn workers.
+# =========================
+MEDIA_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+_media = {"at": 0.0, "index": {}, "stats": {}}  # index: KEY -> {path, sha}; stats: path -> (mtime_ns, size, sha)
+_media_lock = threading.Lock()
+_media_key_locks = {}
+_media_failed = {}  # KEY -> (sha, retry_at): upload of this content failed, don't retry before retry_at
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan_media(force: bool = False) -> dict:
+    """KEY -> {"path", "sha"}. Re-stats MEDIA_DIR every MEDIA_SCAN_SEC, re-hashes only changed files."""
+    if not MEDIA_DIR:
+        return {}
+    now = time.monotonic()
+    with _media_lock:
+        if not force and now - _media["at"] < MEDIA_SCAN_SEC:
+            return _media["index"]
+        old_stats = _media["stats"]
+
+    index, stats = {}, {}
+    try:
+        names = sorted(os.listdir(MEDIA_DIR))
+    except OSError as e:
+        print(f"[MEDIA] cannot read {MEDIA_DIR}: {e}")
+        names = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in MEDIA_EXTS:
+            continue
+        path = os.path.join(MEDIA_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        prev = old_stats.get(path)
+        if prev and prev[0] == st.st_mtime_ns and prev[1] == st.st_size:
+            sha = prev[2]
+        else:
+            sha = _file_sha256(path)
+        stats[path] = (st.st_mtime_ns, st.st_size, sha)
+        index[stem.upper()] = {"path": path, "sha": sha}
+
+    with _media_lock:
+        _media["at"] = now
+        _media["index"] = index
+        _media["stats"] = stats
+    return index
+
+
+def _media_key_lock(key: str) -> threading.Lock:
+    with _media_lock:
+        return _media_key_locks.setdefault(key, threading.Lock())
+
+
+def acquire_media_lease(key: str, owner: str) -> bool:
+    now = time.time()
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO media_locks(key, owner, expires_at) VALUES(?,?,?)
+        ON CONFLICT(key) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+        WHERE media_locks.expires_at < ?
+        """,
+        (key, owner, now + MEDIA_LEASE_SEC, now),
+    )
+    ok = cur.rowcount == 1
+    conn.commit()
+    conn.close()
+    return ok
+
+
+def release_media_lease(key: str, owner: str):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM media_locks WHERE key=? AND owner=?", (key, owner))
+    conn.commit()
+    conn.close()
+
+
+def renew_media_lease(key: str, owner: str) -> bool:
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE media_locks SET expires_at=? WHERE key=? AND owner=?",
+        (time.time() + MEDIA_LEASE_SEC, key, owner),
+    )
+    ok = cur.rowcount == 1
+    conn.commit()
+    conn.close()
+    return ok
+
+
+def _renew_media_lease_loop(key: str, owner: str, done: threading.Event):
+    while not done.wait(MEDIA_LEASE_SEC / 3):
+        try:
+            if not renew_media_lease(key, owner):
+                return
+        except Exception as e:
+            print(f"[MEDIA] renew lease {key} error: {e}")
+
+
+def _cached_media_file_id(key: str, sha: str):
+    row = get_image_row(key)
+    return row["file_id"] if row and row["content_hash"] == sha else None
+
+
+def _media_upload_failed(key: str, sha: str) -> bool:
+    with _media_lock:
+        failed = _media_failed.get(key)
+    return bool(failed) and failed[0] == sha and time.monotonic() < failed[1]
+
+
+def _upload_media_photo(chat_id: int, key: str, entry: dict, caption: str, reply_markup=None) -> bool:
+    """Upload and harvest under the cross-worker lease; False if another worker holds it or the upload failed."""
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    if not acquire_media_lease(key, owner):
+        return False
+    done = threading.Event()
+    threading.Thread(target=_renew_media_lease_loop, args=(key, owner, done), daemon=True).start()
+    try:
+        try:
+            with open(entry["path"], "rb") as f:
+                msg = bot.send_photo(chat_id, f, caption=caption, parse_mode="Markdown", reply_markup=reply_markup)
+        except Exception as e:
+            with _media_lock:
+                _media_failed[key] = (entry["sha"], time.monotonic() + MEDIA_RETRY_SEC)
+            print(f"[MEDIA] upload {key} failed, sending without photo for {MEDIA_RETRY_SEC:.0f}s: {e}")
+            return False
+        set_image(key, msg.photo[-1].file_id, content_hash=entry["sha"])
+        print(f"[MEDIA] uploaded {key} -> file_id")
+        return True
+    finally:
+        done.set()
+        release_media_lease(key, owner)
+
+
+def send_media_photo(chat_id: int, key: str, entry: dict, caption: str, reply_markup=None):
+    """Send by file_id when harvested for this content; otherwise upload once and harvest.
+
+    While another thread/worker is uploading the same file, or its upload recently
+    failed, send the caption as text instead of waiting or uploading again.
+    """
+    file_id = _cached_media_file_id(key, entry["sha"])
+    if not file_id:
+        lock = _media_key_lock(key)
+        if not _media_upload_failed(key, entry["sha"]) and lock.acquire(blocking=False):
+            try:
+                file_id = _cached_media_file_id(key, entry["sha"])
+                if not file_id and _upload_media_photo(chat_id, key, entry, caption, reply_markup):
+                    return
+            finally:
+                lock.release()
+        if not file_id:
+            bot.send_message(chat_id, caption, parse_mode="Markdown", reply_markup=reply_markup)
+            return
+    bot.send_photo(chat_id, file_id, caption=caption, parse_mode="Markdown", reply_markup=reply_markup)
+
+
+# =========================
+# Inventory (stock + time-limited reservations)
+# Every stock change is a single conditional UPDATE, so it stays correct
+# across gunicorn workers without read-modify-write in Python.
+# =========================
+_stock_cache = {"at": 0.0, "data": {}}
+_stock_lock = threading.Lock()
+
+
+def invalidate_stock_cache():
+    with _stock_lock:
+        _stock_cache["at"] = 0.0
+
+
+def get_stock_map():
+    """item_id -> available. Items without an inventory row are unlimited (absent)."""
+    now = time.monotonic()
+    with _stock_lock:
+        if now - _stock_cache["at"] < STOCK_CACHE_SEC:
+            return _stock_cache["data"]
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT item_id, available FROM inventory")
+    data = {row["item_id"]: row["available"] for row in cur.fetchall()}
+    conn.close()
+    with _stock_lock:
+        _stock_cache["at"] = now
+        _stock_cache["data"] = data
+    return data
+
+
+def stock_available(item_id: str):
+    return get_stock_map().get(item_id)
+
+
+def set_stock(item_id: str, available: int):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO inventory(item_id, available, reserved, updated_at)
+        VALUES(?,?,(SELECT COALESCE(SUM(qty), 0) FROM reservations WHERE item_id=? AND status='HELD'),?)
+        ON CONFLICT(item_id) DO UPDATE SET
+            available=excluded.available, reserved=excluded.reserved, updated_at=excluded.updated_at
+        """,
+        (item_id, available, item_id, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+    invalidate_stock_cache()
+
+
+def delete_stock(item_id: str):
+    """
+    Stop tracking stock.
+    Returns True when removed, False while holds on the item are still open, None if it wasn't tracked.
+    """
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        DELETE FROM inventory
+        WHERE item_id=? AND NOT EXISTS (SELECT 1 FROM reservations WHERE item_id=? AND status='HELD')
+        """,
+        (item_id, item_id),
+    )
+    ok = cur.rowcount == 1
+    if not ok:
+        cur.execute("SELECT 1 FROM inventory WHERE item_id=?", (item_id,))
+        if cur.fetchone() is None:
+            ok = None
+    conn.commit()
+    conn.close()
+    invalidate_stock_cache()
+    return ok
+
+
+def take_stock(item_id: str, qty: int) -> bool:
+    """Sell `qty` without a hold (e.g. /paid). Untracked items always succeed."""
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE inventory SET available=available-?, updated_at=? WHERE item_id=? AND available>=?",
+        (qty, datetime.utcnow().isoformat(), item_id, qty),
+    )
+    ok = cur.rowcount == 1
+    if not ok:
+        cur.execute("SELECT 1 FROM inventory WHERE item_id=?", (item_id,))
+        ok = cur.fetchone() is None
+    conn.commit()
+    conn.close()
+    invalidate_stock_cache()
+    return ok
+
+
+def list_stock():
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT item_id, available, reserved FROM inventory ORDER BY item_id")
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def reserve_stock(item_id: str, user_id: int, qty: int = 1, lang=None):
+    """
+    Hold `qty` units for `user_id`.
+    Returns (reservation_id, expires_at); reuses (and extends) the user's active hold if any.
+    Returns None when sold out.
+    """
+    expires_at = time.time() + RESERVE_TTL_SEC
+    conn = db_connect()
+    cur = conn.cursor()
+    try:
+        held = _extend_hold(cur, item_id, user_id, expires_at, lang)
+        if held:
+            conn.commit()
+            return held
+        cur.execute(
+            """
+            UPDATE inventory
+            SET available=available-?, reserved=reserved+?, updated_at=?
+            WHERE item_id=? AND available>=?
+            """,
+            (qty, qty, datetime.utcnow().isoformat(), item_id, qty),
+        )
+        if cur.rowcount != 1:
+            conn.rollback()
+            return None
+        try:
+            cur.execute(
+                """
+                INSERT INTO reservations(item_id, user_id, qty, status, created_at, expires_at, lang)
+                VALUES(?,?,?,'HELD',?,?,?)
+                """,
+                (item_id, user_id, qty, datetime.utcnow().isoformat(), expires_at, lang),
+            )
+        except sqlite3.IntegrityError:
+            # same user tapped twice at once and the other tap won -> undo, reuse its hold
+            conn.rollback()
+            held = _extend_hold(cur, item_id, user_id, expires_at, lang)
+            conn.commit()
+            return held
+        res_id = cur.lastrowid
+        conn.commit()
+        return res_id, expires_at
+    finally:
+        conn.close()
+        invalidate_stock_cache()
+
+
+def _extend_hold(cur, item_id: str, user_id: int, expires_at: float, lang=None):
+    cur.execute(
+        """
+        UPDATE reservations SET expires_at=?, lang=COALESCE(?, lang)
+        WHERE item_id=? AND user_id=? AND status='HELD'
+        """,
+        (expires_at, lang, item_id, user_id),
+    )
+    if cur.rowcount != 1:
+        return None
+    cur.execute(
+        "SELECT id FROM reservations WHERE item_id=? AND user_id=? AND status='HELD'",
+        (item_id, user_id),
+    )
+    return cur.fetchone()["id"], expires_at
+
+
+def _close_reservation(res_id: int, new_status: str, restock: bool) -> bool:
+    """HELD -> new_status; only the caller that wins the transition touches inventory."""
+    conn = db_connect()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE reservations SET status=? WHERE id=? AND status='HELD'",
+            (new_status, res_id),
+        )
+        if cur.rowcount != 1:
+            conn.rollback()
+            return False
+        if restock:
+            cur.execute(
+                """
+                UPDATE inventory
+                SET available=available+(SELECT qty FROM reservations WHERE id=?),
+                    reserved=MAX(reserved-(SELECT qty FROM reservations WHERE id=?), 0),
+                    updated_at=?
+                WHERE item_id=(SELECT item_id FROM reservations WHERE id=?)
+                """,
+                (res_id, res_id, datetime.utcnow().isoformat(), res_id),
+            )
+        else:
+            cur.execute(
+                """
+                UPDATE inventory
+                SET reserved=MAX(reserved-(SELECT qty FROM reservations WHERE id=?), 0),
+                    updated_at=?
+                WHERE item_id=(SELECT item_id FROM reservations WHERE id=?)
+                """,
+                (res_id, datetime.utcnow().isoformat(), res_id),
+            )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+        invalidate_stock_cache()
+
+
+def last_reservation_lang(user_id: int):
+    """Language the user was browsing in at their latest hold (resolved, not just /lang)."""
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT lang FROM reservations WHERE user_id=? AND lang IS NOT NULL ORDER BY id DESC LIMIT 1", (user_id,)
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row["lang"] if row else None
+
+
+def get_reservation(res_id: int):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM reservations WHERE id=? LIMIT 1", (res_id,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def confirm_reservation(res_id: int) -> bool:
+    return _close_reservation(res_id, "SOLD", restock=False)
+
+
+def cancel_reservation(res_id: int) -> bool:
+    return _close_reservation(res_id, "CANCELLED", restock=True)
+
+
+def expire_reservations() -> int:
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id FROM reservations WHERE status='HELD' AND expires_at<?",
+        (time.time(),),
+    )
+    ids = [row["id"] for row in cur.fetchall()]
+    conn.close()
+    n = 0
+    for res_id in ids:
+        try:
+            n += _close_reservation(res_id, "EXPIRED", restock=True)
+        except Exception as e:
+            # one broken hold must not block the rest of the sweep
+            print(f"[STOCK] cannot expire reservation #{res_id}: {e}")
+    return n
+
+
+def _stock_sweeper():
+    while True:
+        time.sleep(STOCK_SWEEP_SEC)
+        try:
+            n = expire_reservations()
+            if n:
+                print(f"[STOCK] expired {n} reservation(s)")
+        except Exception as e:
+            print(f"[STOCK] sweeper error: {e}")
+
+
+def start_stock_sweeper():
+    if STOCK_SWEEP_SEC > 0:
+        threading.Thread(target=_stock_sweeper, name="stock-sweeper", daemon=True).start()
+
+
+# =========================
+# Delivery (vault of credentials/files -> buyer)
+# Admin uploads units per item_id; a paid order becomes a `deliveries` row that
+# the worker claims (PENDING -> SENDING), binds N vault units to and sends.
+# Units stay bound to the delivery, so retries resend the same units. A FAILED
+# delivery keeps its units QUARANTINED (the buyer may have received some of them):
+# /redeliver resends them, /release puts them back on sale.
+# =========================
+_delivery_wakeup = threading.Event()
+
+
+def add_vault_units(item_id: str, payloads, kind: str = "text") -> int:
+    now = datetime.utcnow().isoformat()
+    rows = [(item_id, kind, p, now) for p in payloads if p.strip()]
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO vault(item_id, kind, payload, status, created_at) VALUES(?,?,?,'NEW',?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def vault_counts():
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT item_id, status, COUNT(*) AS n FROM vault GROUP BY item_id, status ORDER BY item_id"
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def vault_available(item_id: str) -> int:
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS n FROM vault WHERE item_id=? AND status='NEW'", (item_id,))
+    n = cur.fetchone()["n"]
+    conn.close()
+    return n
+
+
+def _log_delivery(cur, delivery_id: int, event: str, detail: str = ""):
+    cur.execute(
+        "INSERT INTO delivery_log(delivery_id, event, detail, at) VALUES(?,?,?,?)",
+        (delivery_id, event, detail, datetime.utcnow().isoformat()),
+    )
+
+
+def enqueue_delivery(item_id: str, chat_id: int, qty: int = 1, res_id=None, lang=None) -> int:
+    now = datetime.utcnow().isoformat()
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO deliveries(item_id, chat_id, qty, res_id, status, next_try_at, created_at, updated_at, lang)
+        VALUES(?,?,?,?,'PENDING',?,?,?,?)
+        """,
+        (item_id, chat_id, qty, res_id, time.time(), now, now, lang),
+    )
+    delivery_id = cur.lastrowid
+    _log_delivery(cur, delivery_id, "QUEUED", f"{item_id} x{qty} -> {chat_id}")
+    conn.commit()
+    conn.close()
+    _delivery_wakeup.set()
+    return delivery_id
+
+
+def claim_vault_units(delivery_id: int, item_id: str, qty: int):
+    """Bind `qty` NEW units to the delivery in one statement; all-or-nothing."""
+    conn = db_connect()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id, kind, payload FROM vault WHERE delivery_id=? ORDER BY id",
+            (delivery_id,),
+        )
+        units = cur.fetchall()
+        if units:
+            return units  # retry: resend what was already claimed
+        cur.execute(
+            """
+            UPDATE vault SET status='CLAIMED', delivery_id=?
+            WHERE id IN (
+                SELECT id FROM vault WHERE item_id=? AND status='NEW' ORDER BY id LIMIT ?
+            )
+            """,
+            (delivery_id, item_id, qty),
+        )
+        if cur.rowcount != qty:
+            conn.rollback()
+            return None
+        conn.commit()
+        cur.execute(
+            "SELECT id, kind, payload FROM vault WHERE delivery_id=? ORDER BY id",
+            (delivery_id,),
+        )
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def _send_units(chat_id: int, item_id: str, delivery_id: int, units, lang=None):
+    texts = [u["payload"] for u in units if u["kind"] == "text"]
+    files = [u["payload"] for u in units if u["kind"] == "file"]
+    header = bundle(lang or DEFAULT_LANG)["msg"]["delivery_header"].format(delivery_id=delivery_id, item_id=item_id)
+
+    if texts:
+        body = "\n".join(texts)
+        if len(body) + len(header) + 2 > DELIVERY_DOC_CHARS:
+            doc = io.BytesIO(body.encode("utf-8"))
+            bot.send_document(chat_id, doc, caption=header, visible_file_name=f"{item_id}_{delivery_id}.txt")
+        else:
+            bot.send_message(chat_id, f"{header}\n\n{body}")
+    for file_id in files:
+        bot.send_document(chat_id, file_id, caption=header)
+
+
+def _finish_delivery(
+    delivery_id: int, attempt: int, status: str, event: str, detail: str = "", retry_in: float = 0
+) -> bool:
+    """SENDING -> status, only for the attempt that claimed it (a reclaimed delivery has moved on)."""
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE deliveries SET status=?, last_error=?, next_try_at=?, updated_at=?
+        WHERE id=? AND status='SENDING' AND attempts=?
+        """,
+        (
+            status,
+            None if status == "DONE" else detail,
+            time.time() + retry_in,
+            datetime.utcnow().isoformat(),
+            delivery_id,
+            attempt,
+        ),
+    )
+    if cur.rowcount != 1:
+        conn.rollback()
+        conn.close()
+        print(f"[DELIVERY] #{delivery_id} attempt {attempt} was reclaimed, dropping its result")
+        return False
+    if status == "DONE":
+        cur.execute("UPDATE vault SET status='DELIVERED' WHERE delivery_id=?", (delivery_id,))
+    elif status == "FAILED":
+        # never resell automatically: part of it may already be in the buyer's chat
+        cur.execute("UPDATE vault SET status='QUARANTINED' WHERE delivery_id=?", (delivery_id,))
+    _log_delivery(cur, delivery_id, event, detail)
+    conn.commit()
+    conn.close()
+    return True
+
+
+def process_delivery(delivery_id: int) -> bool:
+    """Returns True if this caller won the delivery and ran an attempt."""
     conn = db_connect()
     cur = conn.cursor()
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS images (
-            key TEXT PRIMARY KEY,
-            file_id TEXT NOT NULL,
-            updated_at TEXT NOT NULL
-        )
-        """
+        UPDATE deliveries SET status='SENDING', attempts=attempts+1, updated_at=?
+        WHERE id=? AND status='PENDING'
+        """,
+        (datetime.utcnow().isoformat(), delivery_id),
     )
+    if cur.rowcount != 1:
+        conn.rollback()
+        conn.close()
+        return False
+    cur.execute("SELECT item_id, chat_id, qty, attempts, lang FROM deliveries WHERE id=?", (delivery_id,))
+    d = cur.fetchone()
+    _log_delivery(cur, delivery_id, "CLAIMED", f"attempt {d['attempts']}")
     conn.commit()
     conn.close()
 
+    try:
+        units = claim_vault_units(delivery_id, d["item_id"], d["qty"])
+        if units is None:
+            raise RuntimeError("not enough units in vault")
+        _send_units(d["chat_id"], d["item_id"], delivery_id, units, lang=d["lang"])
+    except Exception as e:
+        if d["attempts"] >= DELIVERY_MAX_ATTEMPTS:
+            if not _finish_delivery(delivery_id, d["attempts"], "FAILED", "FAILED", str(e)):
+                return True
+            try:
+                bot.send_message(
+                    ADMIN_CHAT_ID,
+                    f"⚠️ Giao hàng #{delivery_id} thất bại: {e}\n"
+                    f"Giao lại: /redeliver {delivery_id} – hủy và trả hàng về kho: /release {delivery_id}",
+                )
+            except Exception:
+                pass
+        else:
+            backoff = 30 * (2 ** (d["attempts"] - 1))
+            _finish_delivery(
+                delivery_id, d["attempts"], "PENDING", "RETRY", f"attempt {d['attempts']}: {e}", retry_in=backoff
+            )
+        return True
+
+    _finish_delivery(delivery_id, d["attempts"], "DONE", "DELIVERED", f"{len(units)} unit(s)")
+    return True
+
+
+def process_deliveries(limit: int = 50) -> int:
+    conn = db_connect()
+    cur = conn.cursor()
+    # SENDING for too long = worker died mid-send -> hand it back to the queue
+    stale_before = datetime.utcfromtimestamp(time.time() - 300).isoformat()
+    cur.execute("SELECT id FROM deliveries WHERE status='SENDING' AND updated_at<?", (stale_before,))
+    for row in cur.fetchall():
+        cur.execute(
+            "UPDATE deliveries SET status='PENDING' WHERE id=? AND status='SENDING' AND updated_at<?",
+            (row["id"], stale_before),
+        )
+        if cur.rowcount == 1:
+            _log_delivery(cur, row["id"], "RECLAIMED", "stuck in SENDING > 300s")
+    conn.commit()
+    cur.execute(
+        "SELECT id FROM deliveries WHERE status='PENDING' AND next_try_at<=? ORDER BY id LIMIT ?",
+        (time.time(), limit),
+    )
+    ids = [row["id"] for row in cur.fetchall()]
+    conn.close()
+    return sum(1 for delivery_id in ids if process_delivery(delivery_id))
+
 
-def set_image(key: str, file_id: str):
+def get_delivery(delivery_id: int):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM deliveries WHERE id=? LIMIT 1", (delivery_id,))
+    row = cur.fetchone()
+    cur.execute("SELECT event, detail, at FROM delivery_log WHERE delivery_id=? ORDER BY id", (delivery_id,))
+    log = cur.fetchall()
+    conn.close()
+    return row, log
+
+
+def requeue_delivery(delivery_id: int) -> bool:
     conn = db_connect()
     cur = conn.cursor()
     cur.execute(
         """
-        INSERT INTO images(key, file_id, updated_at)
-        VALUES(?,?,?)
-        ON CONFLICT(key) DO UPDATE SET file_id=excluded.file_id, updated_at=excluded.updated_at
+        UPDATE deliveries SET status='PENDING', attempts=0, next_try_at=?, updated_at=?
+        WHERE id=? AND status='FAILED'
         """,
-        (key.upper(), file_id, datetime.utcnow().isoformat()),
+        (time.time(), datetime.utcnow().isoformat(), delivery_id),
     )
+    ok = cur.rowcount == 1
+    if ok:
+        cur.execute(
+            "UPDATE vault SET status='CLAIMED' WHERE delivery_id=? AND status='QUARANTINED'", (delivery_id,)
+        )
+        _log_delivery(cur, delivery_id, "REQUEUED")
     conn.commit()
     conn.close()
+    if ok:
+        _delivery_wakeup.set()
+    return ok
 
 
-def get_image(key: str):
+def release_delivery(delivery_id: int):
+    """
+    Give up on a FAILED delivery: its units go back to NEW and its qty back to inventory.
+    Returns the number of units released, or None if the delivery isn't FAILED.
+    """
     conn = db_connect()
     cur = conn.cursor()
-    cur.execute("SELECT file_id FROM images WHERE key=? LIMIT 1", (key.upper(),))
-    row = cur.fetchone()
+    cur.execute(
+        "UPDATE deliveries SET status='RELEASED', updated_at=? WHERE id=? AND status='FAILED'",
+        (datetime.utcnow().isoformat(), delivery_id),
+    )
+    if cur.rowcount != 1:
+        conn.rollback()
+        conn.close()
+        return None
+    cur.execute("UPDATE vault SET status='NEW', delivery_id=NULL WHERE delivery_id=?", (delivery_id,))
+    n = cur.rowcount
+    cur.execute("SELECT item_id, qty FROM deliveries WHERE id=?", (delivery_id,))
+    d = cur.fetchone()
+    cur.execute(
+        "UPDATE inventory SET available=available+?, updated_at=? WHERE item_id=?",
+        (d["qty"], datetime.utcnow().isoformat(), d["item_id"]),
+    )
+    _log_delivery(cur, delivery_id, "RELEASED", f"{n} unit(s) back to vault")
+    conn.commit()
     conn.close()
-    return row["file_id"] if row else None
+    invalidate_stock_cache()
+    return n
+
+
+def _delivery_worker():
+    while True:
+        _delivery_wakeup.wait(DELIVERY_POLL_SEC)
+        _delivery_wakeup.clear()
+        try:
+            while process_deliveries():
+                pass
+        except Exception as e:
+            print(f"[DELIVERY] worker error: {e}")
+
+
+def start_delivery_worker():
+    if DELIVERY_POLL_SEC > 0:
+        threading.Thread(target=_delivery_worker, name="delivery-worker", daemon=True).start()
 
 
 # Init DB at import time (works with gunicorn)
 init_db()
+start_stock_sweeper()
+start_delivery_worker()
 
 # =========================
 # Helpers
@@ -101,6 +1002,10 @@ def is_admin(user) -> bool:
 
 
 def send_with_optional_photo(chat_id: int, img_key: str, caption: str, reply_markup=None):
+    entry = scan_media().get(img_key.upper())
+    if entry:
+        send_media_photo(chat_id, img_key.upper(), entry, caption, reply_markup=reply_markup)
+        return
     file_id = get_image(img_key)
     if file_id:
         bot.send_photo(chat_id, file_id, caption=caption, parse_mode="Markdown", reply_markup=reply_markup)
@@ -178,6 +1083,7 @@ CATALOG = [
                     "⚠️ Tuyệt đối không dán file .exe vào thư mục khi file chưa được giải nén hoàn toàn."
                 ),
                 "require_hint": "Ghi chú: . . ., Số lượng :  ",
+                "auto_deliver": True,  # giao tự động từ vault khi đơn đã thanh toán
             },
             {
                 "item_id": "TELE_UPSTAR",
@@ -440,6 +1346,7 @@ CATALOG = [
                 "price": "13.000đ",
                 "detail": "🏦 **Bạn cần có tài khoản MB Bank để admin tạo thêm tài khoản MB mới cho bạn, hoặc không thì khi chơi phải rút tiền về tk của ad**\n💰 Giá: **13.000đ / 1 TK**\n📌 Dùng theo nhu cầu tạo tài khoản game lấy nạp đầu, đánh đối lấy chỉ tiêu,...",
                 "require_hint": "Yêu cầu: SL",
+                "auto_deliver": True,  # giao tự động từ vault khi đơn đã thanh toán
             },
         ],
         "img_key": "CAT_MB",
@@ -456,6 +1363,7 @@ CATALOG = [
                 "price": "7.000đ",
                 "detail": "📲 **OTP SĐT đăng ký game**\n💰 Giá: **7.000đ / 1 OTP**\n📌 Khi mua, ghi rõ nền tảng/game cần OTP.",
                 "require_hint": "Yêu cầu: nền tảng/game",
+                "auto_deliver": True,  # giao tự động từ vault khi đơn đã thanh toán
             },
         ],
         "img_key": "CAT_OTP",
@@ -499,104 +1407,541 @@ for c in CATALOG:
         ITEM_BY_ID[it["item_id"]] = (c["cat_id"], it)
 
 # =========================
-# UI (menu chính 2 cột)
+# i18n - message bundles
+# vi is the source language; other locales overlay it, so a missing key
+# simply stays Vietnamese. Bundles (texts + keyboards) are compiled once
+# at import, handlers only do dict lookups.
 # =========================
-def kb_main():
+DEFAULT_LANG = "vi"
+LANG_CACHE_SIZE = 4096
+LANG_STAMP_PATH = f"{DB_PATH}.lang-stamp"  # +1 byte per /lang change -> all workers drop their cache
+
+MESSAGES = {
+    "vi": {
+        "lang_name": "🇻🇳 Tiếng Việt",
+        "start": (
+            "👋 **Chào mừng bạn đến với {shop}**\n\n"
+            "✅ Bảng giá rõ ràng – hỗ trợ nhanh – xử lý gọn\n"
+            "👉 Chọn danh mục bên dưới 👇"
+        ),
+        "payment": (
+            "💳 **THÔNG TIN THANH TOÁN – {shop}**\n\n"
+            "🏦 **Ngân hàng:** Vietcombank ({bank})\n"
+            "👤 **Chủ TK:** {account_name}\n"
+            "🔢 **STK:** {account_no}\n\n"
+            "✅ **NỘI DUNG CHUYỂN KHOẢN (BẮT BUỘC):**\n"
+            "`@username + TÊN SẢN PHẨM`\n\n"
+            "📌 Chuyển xong, chụp bill gửi admin để xác nhận nhanh."
+        ),
+        "item": "✅ **{name}**\n💰 **Giá:** **{price}**\n\n{detail}",
+        "reserved": (
+            "🔒 **Đã giữ hàng: {name}**\n"
+            "🧾 Mã giữ: **#{res_id}**\n"
+            "⏳ Giữ trong **{minutes} phút** – chuyển khoản và gửi bill cho admin trước khi hết hạn."
+        ),
+        "sold_out": "❌ **{name}** đã hết hàng.",
+        "stock_left": " | còn {n}",
+        "stock_none": " | ❌ HẾT HÀNG",
+        "delivery_header": "📦 Đơn giao #{delivery_id} – {item_id}",
+        "no_category": "❌ Danh mục không tồn tại.",
+        "no_item": "❌ Sản phẩm không tồn tại.",
+        "unknown_action": "❓ Không hiểu thao tác. Gõ /start để bắt đầu lại.",
+        "error": "⚠️ Có lỗi nhỏ xảy ra.\nChi tiết: {e}",
+        "lang_pick": "🌐 Chọn ngôn ngữ:",
+        "lang_set": "✅ Đã chuyển sang Tiếng Việt.",
+        "btn_lang": "🌐 Language",
+        "btn_pay": "💳 Thanh toán",
+        "btn_admin": "📩 Admin",
+        "btn_msg_admin": "📩 Nhắn Admin",
+        "btn_send_bill": "📩 Gửi bill cho Admin",
+        "btn_send_order": "📩 Gửi đơn cho Admin (soạn sẵn)",
+        "btn_buy": "✅ MUA NGAY (soạn sẵn)",
+        "btn_buy_hold": "✅ MUA NGAY (giữ hàng)",
+        "btn_back_menu": "⏪ Quay lại menu",
+        "btn_back_short": "⏪ Quay lại",
+        "btn_back_cat": "⏪ Quay lại danh mục",
+        "menu_DOMAIN": "🌐 TÊN MIỀN",
+        "menu_TELE": "📱 TELE",
+        "menu_FB": "📘 FACEBOOK",
+        "menu_ZALO": "💬 ZALO",
+        "menu_TIKTOK": "🎵 TIKTOK",
+        "menu_WEB": "🖥️ LÀM WEB",
+        "menu_BOT": "🤖🧠 BOT SPAM CHO SALE",
+        "menu_OTP": "📲 OTP SĐT",
+        "menu_MB": "🏦 STK MB BANK",
+    },
+    "en": {
+        "lang_name": "🇬🇧 English",
+        "start": (
+            "👋 **Welcome to {shop}**\n\n"
+            "✅ Clear prices – fast support – smooth handling\n"
+            "👉 Pick a category below 👇"
+        ),
+        "payment": (
+            "💳 **PAYMENT DETAILS – {shop}**\n\n"
+            "🏦 **Bank:** Vietcombank ({bank})\n"
+            "👤 **Account name:** {account_name}\n"
+            "🔢 **Account no.:** {account_no}\n\n"
+            "✅ **TRANSFER NOTE (REQUIRED):**\n"
+            "`@username + PRODUCT NAME`\n\n"
+            "📌 After paying, send a screenshot of the receipt to the admin for quick confirmation."
+        ),
+        "item": "✅ **{name}**\n💰 **Price:** **{price}**\n\n{detail}",
+        "reserved": (
+            "🔒 **Reserved: {name}**\n"
+            "🧾 Hold code: **#{res_id}**\n"
+            "⏳ Held for **{minutes} min** – pay and send the receipt to the admin before it expires."
+        ),
+        "sold_out": "❌ **{name}** is sold out.",
+        "stock_left": " | {n} left",
+        "stock_none": " | ❌ SOLD OUT",
+        "delivery_header": "📦 Delivery #{delivery_id} – {item_id}",
+        "no_category": "❌ Category not found.",
+        "no_item": "❌ Product not found.",
+        "unknown_action": "❓ Unknown action. Type /start to begin again.",
+        "error": "⚠️ Something went wrong.\nDetails: {e}",
+        "lang_pick": "🌐 Choose your language:",
+        "lang_set": "✅ Switched to English.",
+        "btn_lang": "🌐 Ngôn ngữ",
+        "btn_pay": "💳 Payment",
+        "btn_msg_admin": "📩 Message Admin",
+        "btn_send_bill": "📩 Send receipt to Admin",
+        "btn_send_order": "📩 Send order to Admin (prefilled)",
+        "btn_buy": "✅ BUY NOW (prefilled)",
+        "btn_buy_hold": "✅ BUY NOW (reserve)",
+        "btn_back_menu": "⏪ Back to menu",
+        "btn_back_short": "⏪ Back",
+        "btn_back_cat": "⏪ Back to category",
+        "menu_DOMAIN": "🌐 DOMAINS",
+        "menu_BOT": "🤖🧠 SALES SPAM BOT",
+        "menu_OTP": "📲 PHONE OTP",
+        "menu_MB": "🏦 MB BANK ACCOUNT",
+        "menu_WEB": "🖥️ WEB DESIGN",
+    },
+}
+
+# Per-locale overrides for CATALOG: "CAT_<cat_id>" -> title/desc, item_id -> name/price/detail
+CATALOG_I18N = {
+    "en": {
+        "CAT_TELE": {"desc": "📱 **TELE – Products**\n👉 Pick an item below 👇"},
+        "TELE_CLONE": {
+            "name": "Telegram account for group spam",
+            "detail": "🐙 **Basic Telegram account**\n💰 Price: **35.000đ**\n📌 Help with first login\n🎁 1-for-1 replacement if the account gets frozen",
+        },
+        "TELE_VIP": {
+            "name": "Telegram account with 1-month Premium",
+            "detail": "🐙 **Telegram account with extra features**\n💰 Price: **200.000đ**\n📌 Help with first login\n🎁 1-for-1 replacement if the account gets frozen",
+        },
+        "TELE_PACK": {
+            "name": "📌TELEGRAM 50-NUMBER PACK - AGED",
+            "detail": (
+                "✅ Help with first login\n"
+                "✅ Solid, stable, long-lasting accounts\n"
+                "✅ Can be used as a boss account\n"
+                "🎁 1-for-1 replacement within 24h if frozen under warranty terms\n\n"
+                "📌 Usage notes:\n"
+                "🔹 Log in with the session file only once\n"
+                "🔹 To move to another device, log in manually with the phone number\n"
+                "🔹 Logging in on 2 devices with the file logs the account out – no warranty\n\n"
+                "📣 Warranty conditions:\n"
+                "🎥 Record a video from opening the account through checking it so the shop can help.\n\n"
+                "⚠️ Never drop the .exe into the folder before the archive is fully extracted."
+            ),
+        },
+        "TELE_UPSTAR": {
+            "name": "Telegram Premium by month",
+            "price": "See details",
+            "detail": (
+                "**🐙 TELEGRAM PREMIUM UPGRADE**\n\n"
+                "✅ 1 month: **125.000đ**\n"
+                "✅ 3 months: **360.000đ**\n"
+                "✅ 6 months: **550.000đ**\n"
+                "✅ 1 year: **850.000đ**\n\n"
+                "📌 Warranty covers the upgrade period; frozen accounts are not covered"
+            ),
+        },
+        "TELE_GROUP": {
+            "name": " Telegram channel (size table)",
+            "price": "See details",
+            "detail": (
+                "👥 ** TELEGRAM CHANNEL**\n\n"
+                "📱 1.7K–2K members: **150.000đ**\n"
+                "📱 5K members: **400.000đ**\n"
+                "📱 10K members: **800.000đ**\n"
+                "📱 20K members: **1.500.000đ**\n\n"
+                "🎁 Buy 8 get 1 free (same type)\n"
+                "📌 Ownership handed over step by step"
+            ),
+        },
+        "TELE_GROUP_ONLINE": {
+            "name": "Telegram group with members online 24/7 ",
+            "price": "See details",
+            "detail": (
+                "🔥 ** ONLINE MEMBERS**\n\n"
+                "📱 500 online members: **400.000đ**\n"
+                "📱 1K online members: **800.000đ**\n"
+                "📱 2K online members: **1.500.000đ**\n"
+                "📱 5K online members: **4.000.000đ**\n"
+                "📱 10K online members: **7.500.000đ**\n\n"
+                "🎁 30-DAY TERM, WARRANTY IF ONLINE MEMBERS DROP\n"
+                "⚠️ GROUP DELIVERED WITH THE REQUESTED MEMBER COUNT BY TRANSFERRING GROUP OWNERSHIP."
+            ),
+        },
+        "CAT_DOMAIN": {
+            "title": "🌐 DOMAINS",
+            "desc": (
+                "🌐 **Price – 370K / 1 domain .CLICK  .PRO	.LIVE	.LOVE	.VIP    .ONLINE    .SHOP	.ORG	.STORE	.TECH	.XYZ	.FUN	**\n"
+                "✅ Warranty for the whole time you use it\n"
+                "✅ Backend switch in ~3 minutes\n"
+                "👉 Pick an item below 👇"
+            ),
+        },
+        "DOMAIN_370": {
+            "name": "Flat-price domains: .CLICK  .PRO	.LIVE	.LOVE	.VIP    .ONLINE    .SHOP	.ORG	.STORE	.TECH	.XYZ	.FUN",
+            "detail": (
+                "✅ Warranty for the whole time you use it\n"
+                "✅ Backend switch in ~3 minutes\n\n"
+                "📌 When ordering, state the **extension** (...) and the **keyword**."
+            ),
+        },
+        "CAT_FB": {
+            "title": "📘 FACEBOOK PROFILES & PAGES",
+            "desc": "📘 **AGED PAGES & LIVESTREAM**\n👉 Pick an item below 👇",
+        },
+        "FB_ACTIVE": {
+            "name": "GREAT FOR SPAM",
+            "detail": "🟢 **Great for spam, no warranty**\n💰 Price: **150.000đ**\n📌 Good for posting / content management",
+        },
+        "FB_PAGE_MANAGER": {
+            "name": "PROFILE OWNING A PAGE - STURDIER",
+            "detail": "🟢 **DO NOT CHANGE NAME/PHOTO, ALREADY ID-VERIFIED - CHANGES THAT KILL THE ACCOUNT ARE NOT COVERED - 24H SOAK WARRANTY**\n💰 Price: **250.000đ**\n📌 1-for-1 recovery warranty within 24h",
+        },
+        "FB_OLD": {
+            "name": "AGED PROFILE WITH POSTS",
+            "detail": "🟢 **GOOD FOR BUILDING A PERSONA: 2019 ~ 2024 WITH EDITABLE POSTS: 450 ~ 1M5 ( ID CHECK AVAILABLE )**\n💰 Price: **450.000đ – 1.500.000đ**\n📌 Choose to fit your needs",
+        },
+        "FB_VERIFY": {
+            "name": "VERIFIED FB 500K",
+            "price": "500.000đ (upkeep 200k/month)",
+            "detail": "🟢 **BADGE UPKEEP 200/MONTH**\n💰 Price: **500.000đ**\n📌 Upkeep: **200.000đ/month**",
+        },
+        "PAGE_LIVE": {
+            "name": "LIVESTREAM 1K FOLLOWERS",
+            "detail": "📄 **LIVESTREAM ADS ENABLED**\n💰 Price: **750.000đ**\n📌 Admin rights handed over step by step",
+        },
+        "PAGE_VERIFY": {"name": "VERIFIED PAGE", "detail": "📄 **VERIFIED PAGE**\n💰 Price: **1.500.000đ**"},
+        "PAGE_BASIC": {"name": "BLANK PAGE", "detail": "📄 **BLANK PAGE**\n💰 Price: **150.000đ**\n📌 0 followers"},
+        "PAGE_1K": {"name": "AGED PAGE 1K FOLLOWERS", "detail": "📄 **AGED 1K FOLLOWERS**\n💰 Price: **200.000đ**"},
+        "PAGE_5K": {"name": "AGED PAGE 5K FOLLOWERS", "detail": "📄 **AGED 5K FOLLOWERS**\n💰 Price: **450.000đ**"},
+        "PAGE_10K": {"name": "AGED PAGE 10K FOLLOWERS", "detail": "📄 **AGED 10K FOLLOWERS**\n💰 Price: **750.000đ**"},
+        "CAT_ZALO": {"desc": "💬 **ZALO – Products**\n👉 Pick an item below 👇"},
+        "CAT_TIKTOK": {"desc": "🎵 **TIKTOK – Products**\n👉 Pick an item below 👇"},
+        "TIKTOK_WHITE": {
+            "name": "Fresh TikTok for channel building ",
+            "detail": "🎵 **Fresh TikTok for building a channel**\n💰 Price: **40.000đ**\n📌 Country: **Vietnam - US - UK**\n📌 Good for starting a new channel",
+        },
+        "TIKTOK_BUILD": {
+            "name": "TikTok channel with 1-2K followers ",
+            "detail": "🎵 **TikTok channel with 1K - 2K followers**\n💰 Price: **200.000đ**\n📌 Country: **Vietnam - US - UK**",
+        },
+        "TIKTOK_LIVE": {
+            "name": "TikTok LIVE (Vietnam - US - UK)",
+            "detail": "🎵 **TikTok LIVE account**\n💰 Price: **250.000đ**\n📌 Country: **Vietnam - US - UK**\n📌 Login, recovery, 5-min restriction and disconnect all covered.",
+        },
+        "CAT_WEB": {
+            "title": "🖥️ WEB DESIGN",
+            "desc": "🖥️ **CUSTOM WEBSITES **\n💬 ** Lucky-wheel site: e.g. https://u888-vongquaymayman.online/, http://gg88k.xyz/\n💬 **Price:** negotiable\n👉 Pick an item below 👇",
+        },
+        "WEB_QUOTE": {
+            "name": "Website consultation & quote",
+            "price": "Negotiable",
+            "detail": (
+                "🖥️ **WEBSITE CONSULTATION & QUOTE**\n\n"
+                "📌 Send the admin:\n"
+                "- Site type (landing/shop/company)\n"
+                "- Required features\n"
+                "- Reference designs\n"
+                "- Desired timeline\n"
+            ),
+        },
+        "CAT_MB": {
+            "title": "🏦 MB BANK ACCOUNT",
+            "desc": "🏦 **MB Bank accounts for game sign-ups**\n💰 13K / 1 account\n👉 Pick an item below 👇",
+        },
+        "MB_13K": {
+            "name": "MB Bank account",
+            "detail": "🏦 **You need your own MB Bank account so the admin can open a new MB account for you; otherwise winnings must be withdrawn to the admin's account**\n💰 Price: **13.000đ / 1 account**\n📌 For creating game accounts for first-deposit bonuses, wagering targets,...",
+        },
+        "CAT_OTP": {
+            "title": "📲 PHONE OTP",
+            "desc": "📲 **Admin sends a phone number that receives the OTP**\n💰 7K / 1 OTP\n👉 Pick an item below 👇",
+        },
+        "OTP_7K": {
+            "name": "Phone OTP for game sign-up",
+            "detail": "📲 **Phone OTP for game sign-up**\n💰 Price: **7.000đ / 1 OTP**\n📌 When ordering, state the platform/game that needs the OTP.",
+        },
+        "CAT_BOT": {
+            "title": "🤖🧠 FIRST-DEPOSIT PROMO SPAM BOT",
+            "desc": (
+                "🤖🧠 **FIRST-DEPOSIT PROMO SPAM BOT**\n\n"
+                "👉 Example bot: `@GG88codefree_bot`\n"
+                "💰 **Price:** 500.000đ / 1 bot\n"
+                "👉 Pick an item below 👇"
+            ),
+        },
+        "bot_spam": {
+            "name": "First-deposit spam bot",
+            "detail": (
+                "🤖🧠 **FIRST-DEPOSIT SPAM BOT**\n\n"
+                "👉 When a customer opens the bot, it walks them through signing up with the right link.\n\n"
+                "📌 The customer sends the transfer receipt to the bot.\n"
+                "📌 The bot forwards to your Telegram admin:\n"
+                "- Game account name\n"
+                "- Sign-up time\n"
+                "- The customer's transfer receipt\n\n"
+                "✅ Lets the admin track receipts and handle orders faster."
+            ),
+        },
+    },
+}
+
+MAIN_MENU_ROWS = [["DOMAIN"], ["TELE", "FB", "ZALO", "TIKTOK", "WEB", "BOT", "OTP", "MB"]]
+
+
+def _kb_json(kb) -> str:
+    # telebot sends non-JsonSerializable markups as-is -> no per-request json.dumps
+    return kb.to_json()
+
+
+def _compile_bundle(lang: str) -> dict:
+    msg = {**MESSAGES[DEFAULT_LANG], **MESSAGES.get(lang, {})}
+    overrides = CATALOG_I18N.get(lang, {})
+
+    cats, items = {}, {}
+    for c in CATALOG:
+        cats[c["cat_id"]] = {**c, **overrides.get(f"CAT_{c['cat_id']}", {})}
+        for it in c.get("items", []):
+            items[it["item_id"]] = {**it, **overrides.get(it["item_id"], {})}
+
     kb = types.InlineKeyboardMarkup(row_width=2)
+    for row in MAIN_MENU_ROWS:
+        kb.add(*[types.InlineKeyboardButton(msg[f"menu_{cat_id}"], callback_data=f"CAT|{cat_id}") for cat_id in row])
     kb.add(
-        types.InlineKeyboardButton("🌐 TÊN MIỀN", callback_data="CAT|DOMAIN"),
-    )
-    kb.add(
-        types.InlineKeyboardButton("📱 TELE", callback_data="CAT|TELE"),
-        types.InlineKeyboardButton("📘 FACEBOOK", callback_data="CAT|FB"),
-        types.InlineKeyboardButton("💬 ZALO", callback_data="CAT|ZALO"),
-        types.InlineKeyboardButton("🎵 TIKTOK", callback_data="CAT|TIKTOK"),
-        types.InlineKeyboardButton("🖥️ LÀM WEB", callback_data="CAT|WEB"),
-        types.InlineKeyboardButton("🤖🧠 BOT SPAM CHO SALE", callback_data="CAT|BOT"),
-        types.InlineKeyboardButton("📲 OTP SĐT", callback_data="CAT|OTP"),
-        types.InlineKeyboardButton("🏦 STK MB BANK", callback_data="CAT|MB"),        
-        
-    )
-    kb.add(
-        types.InlineKeyboardButton("💳 Thanh toán", callback_data="PAY"),
-        types.InlineKeyboardButton("📩 Admin", url=admin_url()),
+        types.InlineKeyboardButton(msg["btn_pay"], callback_data="PAY"),
+        types.InlineKeyboardButton(msg["btn_admin"], url=admin_url()),
     )
-    return kb
+    kb.add(types.InlineKeyboardButton(msg["btn_lang"], callback_data="LANG"))
+    kb_main_json = _kb_json(kb)
 
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton(msg["btn_send_bill"], url=admin_url()))
+    kb.add(types.InlineKeyboardButton(msg["btn_back_menu"], callback_data="BACK_MAIN"))
+    kb_payment_json = _kb_json(kb)
 
-def kb_category(cat_id: str):
     kb = types.InlineKeyboardMarkup(row_width=1)
-    cat = CAT_BY_ID.get(cat_id)
-    if not cat:
-        kb.add(types.InlineKeyboardButton("⏪ Quay lại", callback_data="BACK_MAIN"))
-        return kb
+    kb.add(types.InlineKeyboardButton(msg["btn_back_short"], callback_data="BACK_MAIN"))
+    kb_missing_json = _kb_json(kb)
+
+    return {
+        "lang": lang,
+        "msg": msg,
+        "cats": cats,
+        "items": items,
+        "start": msg["start"].format(shop=SHOP_NAME),
+        "payment": msg["payment"].format(
+            shop=SHOP_NAME, bank=BANK_NAME, account_name=ACCOUNT_NAME, account_no=ACCOUNT_NO
+        ),
+        "cat_text": {cat_id: f"**{c['title']}**\n\n{c['desc']}" for cat_id, c in cats.items()},
+        "item_text": {
+            item_id: msg["item"].format(name=it["name"], price=it["price"], detail=it["detail"])
+            for item_id, it in items.items()
+        },
+        "cat_labels": {
+            cat_id: [(it["item_id"], f"{items[it['item_id']]['name']} | {items[it['item_id']]['price']}")
+                     for it in c.get("items", [])]
+            for cat_id, c in cats.items()
+        },
+        "kb_main": kb_main_json,
+        "kb_payment": kb_payment_json,
+        "kb_missing": kb_missing_json,
+    }
+
+
+BUNDLES = {lang: _compile_bundle(lang) for lang in MESSAGES}
+
+_kb = types.InlineKeyboardMarkup(row_width=2)
+_kb.add(*[types.InlineKeyboardButton(b["msg"]["lang_name"], callback_data=f"LANG|{lang}") for lang, b in BUNDLES.items()])
+KB_LANG = _kb_json(_kb)
+
+
+def bundle(lang: str) -> dict:
+    return BUNDLES.get(lang) or BUNDLES[DEFAULT_LANG]
+
+
+_lang_cache = OrderedDict()  # user_id -> lang or None, LRU
+_lang_lock = threading.Lock()
+_lang_stamp = {"seen": None}
+
+
+def _lang_stamp_now():
+    try:
+        return os.stat(LANG_STAMP_PATH).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def get_lang_pref(user_id: int):
+    """
+    Language chosen via /lang, or None. PK lookup cached in a bounded LRU
+    (including "no preference") until any worker changes a preference.
+    """
+    stamp = _lang_stamp_now()
+    with _lang_lock:
+        if stamp != _lang_stamp["seen"]:
+            _lang_cache.clear()
+            _lang_stamp["seen"] = stamp
+        elif user_id in _lang_cache:
+            _lang_cache.move_to_end(user_id)
+            return _lang_cache[user_id]
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT lang FROM user_prefs WHERE user_id=? LIMIT 1", (user_id,))
+    row = cur.fetchone()
+    conn.close()
+    lang = row["lang"] if row else None
+    _remember_lang(user_id, lang)
+    return lang
+
 
-    for it in cat.get("items", []):
-        label = f"{it['name']} | {it['price']}"
-        kb.add(types.InlineKeyboardButton(label, callback_data=f"ITEM|{it['item_id']}"))
+def _remember_lang(user_id: int, lang):
+    with _lang_lock:
+        _lang_cache[user_id] = lang
+        _lang_cache.move_to_end(user_id)
+        while len(_lang_cache) > LANG_CACHE_SIZE:
+            _lang_cache.popitem(last=False)
 
-    kb.add(types.InlineKeyboardButton("💳 Thanh toán", callback_data="PAY"))
-    kb.add(types.InlineKeyboardButton("⏪ Quay lại menu", callback_data="BACK_MAIN"))
+
+def set_lang_pref(user_id: int, lang: str):
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO user_prefs(user_id, lang, updated_at)
+        VALUES(?,?,?)
+        ON CONFLICT(user_id) DO UPDATE SET lang=excluded.lang, updated_at=excluded.updated_at
+        """,
+        (user_id, lang, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+    # /lang is rare: tell every worker to drop its cache instead of expiring entries on a timer
+    with open(LANG_STAMP_PATH, "ab") as f:
+        f.write(b".")
+    _remember_lang(user_id, lang)
+
+
+def user_lang(from_user) -> str:
+    pref = get_lang_pref(from_user.id)
+    if pref in BUNDLES:
+        return pref
+    code = (getattr(from_user, "language_code", None) or "").lower().split("-")[0]
+    return code if code in BUNDLES else DEFAULT_LANG
+
+
+# =========================
+# UI (menu chính 2 cột)
+# =========================
+def kb_main(lang: str = DEFAULT_LANG):
+    return bundle(lang)["kb_main"]
+
+
+def kb_category(cat_id: str, lang: str = DEFAULT_LANG):
+    b = bundle(lang)
+    labels = b["cat_labels"].get(cat_id)
+    if labels is None:
+        return b["kb_missing"]
+
+    msg = b["msg"]
+    stock = get_stock_map()
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for item_id, label in labels:
+        left = stock.get(item_id)
+        if left is not None:
+            label += msg["stock_left"].format(n=left) if left > 0 else msg["stock_none"]
+        kb.add(types.InlineKeyboardButton(label, callback_data=f"ITEM|{item_id}"))
+
+    kb.add(types.InlineKeyboardButton(msg["btn_pay"], callback_data="PAY"))
+    kb.add(types.InlineKeyboardButton(msg["btn_back_menu"], callback_data="BACK_MAIN"))
     return kb
 
 
-def kb_item(item_id: str, buy_url: str):
+def kb_item(item_id: str, buy_url: str, lang: str = DEFAULT_LANG):
+    msg = bundle(lang)["msg"]
     kb = types.InlineKeyboardMarkup(row_width=1)
-    kb.add(types.InlineKeyboardButton("✅ MUA NGAY (soạn sẵn)", url=buy_url))
-    kb.add(types.InlineKeyboardButton("💳 Thanh toán", callback_data="PAY"))
-    kb.add(types.InlineKeyboardButton("📩 Nhắn Admin", url=admin_url()))
-    kb.add(types.InlineKeyboardButton("⏪ Quay lại danh mục", callback_data=f"BACKCAT|{item_id}"))
+    if stock_available(item_id) is None:
+        kb.add(types.InlineKeyboardButton(msg["btn_buy"], url=buy_url))
+    else:
+        # hàng có hạn: giữ hàng trước rồi mới mở chat admin
+        kb.add(types.InlineKeyboardButton(msg["btn_buy_hold"], callback_data=f"BUY|{item_id}"))
+    kb.add(types.InlineKeyboardButton(msg["btn_pay"], callback_data="PAY"))
+    kb.add(types.InlineKeyboardButton(msg["btn_msg_admin"], url=admin_url()))
+    kb.add(types.InlineKeyboardButton(msg["btn_back_cat"], callback_data=f"BACKCAT|{item_id}"))
     return kb
 
 
-def kb_payment():
+def kb_reserved(item_id: str, buy_url: str, lang: str = DEFAULT_LANG):
+    msg = bundle(lang)["msg"]
     kb = types.InlineKeyboardMarkup(row_width=1)
-    kb.add(types.InlineKeyboardButton("📩 Gửi bill cho Admin", url=admin_url()))
-    kb.add(types.InlineKeyboardButton("⏪ Quay lại menu", callback_data="BACK_MAIN"))
+    kb.add(types.InlineKeyboardButton(msg["btn_send_order"], url=buy_url))
+    kb.add(types.InlineKeyboardButton(msg["btn_pay"], callback_data="PAY"))
+    kb.add(types.InlineKeyboardButton(msg["btn_back_cat"], callback_data=f"BACKCAT|{item_id}"))
     return kb
 
 
+def kb_payment(lang: str = DEFAULT_LANG):
+    return bundle(lang)["kb_payment"]
+
+
+def kb_lang():
+    return KB_LANG
+
+
 # =========================
 # Text
 # =========================
-def text_start():
-    return (
-        f"👋 **Chào mừng bạn đến với {SHOP_NAME}**\n\n"
-        "✅ Bảng giá rõ ràng – hỗ trợ nhanh – xử lý gọn\n"
-        "👉 Chọn danh mục bên dưới 👇"
-    )
+def text_start(lang: str = DEFAULT_LANG):
+    return bundle(lang)["start"]
 
 
-def text_payment():
-    return (
-        f"💳 **THÔNG TIN THANH TOÁN – {SHOP_NAME}**\n\n"
-        f"🏦 **Ngân hàng:** Vietcombank ({BANK_NAME})\n"
-        f"👤 **Chủ TK:** {ACCOUNT_NAME}\n"
-        f"🔢 **STK:** {ACCOUNT_NO}\n\n"
-        "✅ **NỘI DUNG CHUYỂN KHOẢN (BẮT BUỘC):**\n"
-        "`@username + TÊN SẢN PHẨM`\n\n"
-        "📌 Chuyển xong, chụp bill gửi admin để xác nhận nhanh."
-    )
+def text_payment(lang: str = DEFAULT_LANG):
+    return bundle(lang)["payment"]
 
 
-def category_message(cat_id: str):
-    cat = CAT_BY_ID.get(cat_id)
-    if not cat:
-        return "❌ Danh mục không tồn tại."
-    return f"**{cat['title']}**\n\n{cat['desc']}"
+def category_message(cat_id: str, lang: str = DEFAULT_LANG):
+    b = bundle(lang)
+    return b["cat_text"].get(cat_id) or b["msg"]["no_category"]
 
 
-def item_message(item_id: str):
-    found = ITEM_BY_ID.get(item_id)
-    if not found:
-        return "❌ Sản phẩm không tồn tại."
-    _, it = found
-    return f"✅ **{it['name']}**\n💰 **Giá:** **{it['price']}**\n\n{it['detail']}"
+def item_message(item_id: str, lang: str = DEFAULT_LANG):
+    b = bundle(lang)
+    return b["item_text"].get(item_id) or b["msg"]["no_item"]
 
 
-def build_buy_text(from_user, group: str, product: str, price: str, require_hint: str):
+def build_buy_text(from_user, group: str, product: str, price: str, require_hint: str, res_id=None, lang=None):
+    # gửi cho admin -> luôn tiếng Việt; kèm ngôn ngữ của khách để /paid giao đúng ngôn ngữ
     u = user_tag(from_user)
-    return f"MUA | {group} | {product} | SL: 1 | {price} | Yêu cầu: {require_hint} | User: {u}"
+    text = f"MUA | {group} | {product} | SL: 1 | {price} | Yêu cầu: {require_hint} | User: {u}"
+    if lang:
+        text += f" | Lang: {lang}"
+    if res_id:
+        text += f" | Mã giữ: #{res_id}"
+    return text
+
+
+def text_reserved(item_id: str, res_id: int, expires_at: float, lang: str = DEFAULT_LANG):
+    b = bundle(lang)
+    minutes = max(1, int((expires_at - time.time()) // 60))
+    return b["msg"]["reserved"].format(name=b["items"][item_id]["name"], res_id=res_id, minutes=minutes)
 
 
 # =========================
@@ -604,7 +1949,14 @@ def build_buy_text(from_user, group: str, product: str, price: str, require_hint
 # =========================
 @bot.message_handler(commands=["start"])
 def cmd_start(message):
-    send_with_optional_photo(message.chat.id, "START", text_start(), reply_markup=kb_main())
+    lang = user_lang(message.from_user)
+    send_with_optional_photo(message.chat.id, "START", text_start(lang), reply_markup=kb_main(lang))
+
+
+@bot.message_handler(commands=["lang"])
+def cmd_lang(message):
+    lang = user_lang(message.from_user)
+    bot.send_message(message.chat.id, bundle(lang)["msg"]["lang_pick"], reply_markup=kb_lang())
 
 
 @bot.message_handler(commands=["getid"])
@@ -614,7 +1966,8 @@ def cmd_getid(message):
         "📌 **/getid**: Gửi **1 ảnh** vào đây, bot sẽ trả `file_id`.\n\n"
         "Admin gắn ảnh theo KEY bằng:\n"
         "`/setimg KEY`\n"
-        "Xem KEY: `/listkeys`",
+        "Xem KEY: `/listkeys`\n"
+        "Thư viện ảnh (MEDIA_DIR): `/media`",
         parse_mode="Markdown",
     )
 
@@ -630,6 +1983,265 @@ def cmd_listkeys(message):
     safe_send_markdown(message.chat.id, text)
 
 
+def list_images():
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("SELECT key, content_hash FROM images")
+    rows = {row["key"]: row["content_hash"] for row in cur.fetchall()}
+    conn.close()
+    return rows
+
+
+@bot.message_handler(commands=["media"])
+def cmd_media(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+    if not MEDIA_DIR:
+        bot.reply_to(message, "📁 Chưa cấu hình `MEDIA_DIR`.", parse_mode="Markdown")
+        return
+
+    index = scan_media(force=True)
+    stored = list_images()
+    lines = []
+    for key, entry in sorted(index.items()):
+        if _media_upload_failed(key, entry["sha"]):
+            status = "❌ upload lỗi, đang gửi không kèm ảnh"
+        elif key not in stored:
+            status = "⏳ chưa upload"
+        elif stored[key] == entry["sha"]:
+            status = "✅ đã có file_id"
+        else:
+            status = "🔄 file đã đổi, sẽ upload lại"
+        lines.append(f"- `{os.path.basename(entry['path'])}`: {status}")
+    text = (
+        f"📁 **Media:** `{MEDIA_DIR}` – {len(index)} ảnh\n"
+        "Tên file = KEY (vd `CAT_TELE.jpg`), ảnh được upload ở lần hiển thị đầu tiên.\n\n"
+        + ("\n".join(lines) if lines else "(trống)")
+    )
+    safe_send_markdown(message.chat.id, text)
+
+
+@bot.message_handler(commands=["stock"])
+def cmd_stock(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+
+    parts = message.text.strip().split()
+    if len(parts) == 1:
+        rows = list_stock()
+        if not rows:
+            bot.reply_to(message, "📦 Chưa có sản phẩm nào được quản lý tồn kho.")
+            return
+        text = "📦 **Tồn kho:**\n\n" + "\n".join(
+            [f"- `{r['item_id']}`: còn {r['available']}, đang giữ {r['reserved']}" for r in rows]
+        )
+        safe_send_markdown(message.chat.id, text)
+        return
+
+    item_id = parts[1].strip()
+    if item_id not in ITEM_BY_ID:
+        bot.reply_to(message, f"❌ Không có sản phẩm `{item_id}`.", parse_mode="Markdown")
+        return
+    if len(parts) < 3:
+        bot.reply_to(message, "✅ Dùng: `/stock ITEM_ID SỐ_LƯỢNG` (hoặc `off` để bỏ quản lý)", parse_mode="Markdown")
+        return
+    if parts[2].lower() == "off":
+        deleted = delete_stock(item_id)
+        if deleted is None:
+            bot.reply_to(message, f"ℹ️ `{item_id}` chưa được quản lý tồn kho.", parse_mode="Markdown")
+            return
+        if not deleted:
+            bot.reply_to(
+                message,
+                f"❌ `{item_id}` còn đơn đang giữ hàng – xử lý bằng `/sold` hoặc `/unhold` trước.",
+                parse_mode="Markdown",
+            )
+            return
+        bot.reply_to(message, f"✅ Bỏ quản lý tồn kho cho `{item_id}`.", parse_mode="Markdown")
+        return
+    if not parts[2].isdigit():
+        bot.reply_to(message, "❌ Số lượng phải là số nguyên ≥ 0.")
+        return
+    set_stock(item_id, int(parts[2]))
+    bot.reply_to(message, f"✅ `{item_id}`: còn {int(parts[2])}.", parse_mode="Markdown")
+
+
+@bot.message_handler(commands=["sold", "unhold"])
+def cmd_close_reservation(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+
+    parts = message.text.strip().split()
+    cmd = parts[0].lstrip("/").split("@")[0]
+    if len(parts) < 2 or not parts[1].lstrip("#").isdigit():
+        bot.reply_to(message, f"✅ Dùng: `/{cmd} MÃ_GIỮ`", parse_mode="Markdown")
+        return
+
+    res_id = int(parts[1].lstrip("#"))
+    ok = confirm_reservation(res_id) if cmd == "sold" else cancel_reservation(res_id)
+    if not ok:
+        bot.reply_to(message, f"❌ Mã giữ #{res_id} không còn hiệu lực.")
+        return
+    bot.reply_to(message, f"✅ Đã cập nhật mã giữ #{res_id}.")
+
+    res = get_reservation(res_id)
+    found = ITEM_BY_ID.get(res["item_id"]) if res else None
+    if cmd == "sold" and found and found[1].get("auto_deliver"):
+        # private chat: chat_id == user_id
+        delivery_id = enqueue_delivery(
+            res["item_id"], res["user_id"], res["qty"], res_id=res_id, lang=res["lang"] or get_lang_pref(res["user_id"])
+        )
+        bot.reply_to(message, f"📦 Đã xếp hàng giao tự động: đơn giao #{delivery_id}.")
+
+
+@bot.message_handler(commands=["paid"])
+def cmd_paid(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+
+    parts = message.text.strip().split()
+    usage = "✅ Dùng: `/paid CHAT_ID ITEM_ID [SL] [" + "|".join(BUNDLES) + "]`"
+    if len(parts) < 3 or not parts[1].lstrip("-").isdigit():
+        bot.reply_to(message, usage, parse_mode="Markdown")
+        return
+    item_id = parts[2].strip()
+    found = ITEM_BY_ID.get(item_id)
+    if not found or not found[1].get("auto_deliver"):
+        bot.reply_to(message, f"❌ `{item_id}` không giao tự động.", parse_mode="Markdown")
+        return
+    qty, lang = 1, None
+    for arg in parts[3:]:
+        if arg.isdigit():
+            qty = int(arg)
+        elif arg.lower() in BUNDLES:
+            lang = arg.lower()
+        else:
+            bot.reply_to(message, usage, parse_mode="Markdown")
+            return
+    if qty < 1:
+        bot.reply_to(message, usage, parse_mode="Markdown")
+        return
+
+    # check the vault first: a delivery that can't be filled would leave the stock taken
+    if vault_available(item_id) < qty:
+        bot.reply_to(
+            message, f"❌ Vault `{item_id}` không đủ {qty} đơn vị – nạp thêm bằng `/vault`.", parse_mode="Markdown"
+        )
+        return
+    if not take_stock(item_id, qty):
+        bot.reply_to(message, f"❌ `{item_id}` không đủ tồn kho cho {qty} đơn vị.", parse_mode="Markdown")
+        return
+
+    # private chat: chat_id == user_id; language from the "Lang:" in the buyer's order message
+    chat_id = int(parts[1])
+    lang = lang or get_lang_pref(chat_id) or last_reservation_lang(chat_id)
+    delivery_id = enqueue_delivery(item_id, chat_id, qty, lang=lang)
+    bot.reply_to(message, f"📦 Đã xếp hàng giao tự động: đơn giao #{delivery_id}.")
+
+
+@bot.message_handler(commands=["delivery", "redeliver", "release"])
+def cmd_delivery(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+
+    parts = message.text.strip().split()
+    cmd = parts[0].lstrip("/").split("@")[0]
+    if len(parts) < 2 or not parts[1].lstrip("#").isdigit():
+        bot.reply_to(message, f"✅ Dùng: `/{cmd} MÃ_ĐƠN_GIAO`", parse_mode="Markdown")
+        return
+    delivery_id = int(parts[1].lstrip("#"))
+
+    if cmd == "redeliver":
+        if requeue_delivery(delivery_id):
+            bot.reply_to(message, f"🔁 Đã xếp lại đơn giao #{delivery_id}.")
+        else:
+            bot.reply_to(message, f"❌ Đơn giao #{delivery_id} không ở trạng thái FAILED.")
+        return
+    if cmd == "release":
+        n = release_delivery(delivery_id)
+        if n is None:
+            bot.reply_to(message, f"❌ Đơn giao #{delivery_id} không ở trạng thái FAILED.")
+        else:
+            bot.reply_to(message, f"♻️ Đã hủy đơn giao #{delivery_id}, trả {n} đơn vị về vault và tồn kho.")
+        return
+
+    d, log = get_delivery(delivery_id)
+    if not d:
+        bot.reply_to(message, f"❌ Không có đơn giao #{delivery_id}.")
+        return
+    text = (
+        f"📦 Đơn giao #{delivery_id}: {d['item_id']} x{d['qty']} -> {d['chat_id']}\n"
+        f"Trạng thái: {d['status']} (lần thử: {d['attempts']})\n"
+        + (f"Lỗi cuối: {d['last_error']}\n" if d["last_error"] else "")
+        + "\n"
+        + "\n".join([f"{r['at'][:19]} {r['event']} {r['detail'] or ''}" for r in log])
+    )
+    bot.reply_to(message, text)
+
+
+def _vault_usage():
+    return (
+        "✅ Dùng:\n"
+        "`/vault` – xem số lượng trong kho\n"
+        "`/vault ITEM_ID` + mỗi dòng bên dưới là 1 đơn vị\n"
+        "Hoặc gửi file `.txt` (mỗi dòng 1 đơn vị) / file bất kỳ (1 file = 1 đơn vị) kèm caption `/vault ITEM_ID`"
+    )
+
+
+@bot.message_handler(commands=["vault"])
+def cmd_vault(message):
+    if not is_admin(message.from_user):
+        bot.reply_to(message, "⛔ Lệnh này chỉ dành cho admin.")
+        return
+
+    head, _, body = message.text.partition("\n")
+    parts = head.strip().split()
+    if len(parts) == 1:
+        rows = vault_counts()
+        if not rows:
+            bot.reply_to(message, _vault_usage(), parse_mode="Markdown")
+            return
+        text = "🔐 **Vault:**\n\n" + "\n".join(
+            [f"- `{r['item_id']}` {r['status']}: {r['n']}" for r in rows]
+        )
+        safe_send_markdown(message.chat.id, text)
+        return
+
+    item_id = parts[1].strip()
+    if item_id not in ITEM_BY_ID:
+        bot.reply_to(message, f"❌ Không có sản phẩm `{item_id}`.", parse_mode="Markdown")
+        return
+    n = add_vault_units(item_id, body.splitlines())
+    if not n:
+        bot.reply_to(message, _vault_usage(), parse_mode="Markdown")
+        return
+    bot.reply_to(message, f"✅ Đã thêm {n} đơn vị vào vault `{item_id}`.", parse_mode="Markdown")
+
+
+@bot.message_handler(content_types=["document"])
+def on_document(message):
+    caption = (message.caption or "").strip().split()
+    if not caption or caption[0].split("@")[0] != "/vault" or not is_admin(message.from_user):
+        return
+    if len(caption) < 2 or caption[1] not in ITEM_BY_ID:
+        bot.reply_to(message, _vault_usage(), parse_mode="Markdown")
+        return
+
+    item_id = caption[1]
+    doc = message.document
+    if (doc.file_name or "").lower().endswith(".txt"):
+        raw = bot.download_file(bot.get_file(doc.file_id).file_path)
+        n = add_vault_units(item_id, raw.decode("utf-8", errors="replace").splitlines())
+    else:
+        n = add_vault_units(item_id, [doc.file_id], kind="file")
+    bot.reply_to(message, f"✅ Đã thêm {n} đơn vị vào vault `{item_id}`.", parse_mode="Markdown")
+
+
 admin_waiting_img_key = {}  # chat_id -> key
 
 
@@ -667,35 +2279,52 @@ def on_photo(message):
 # =========================
 @bot.callback_query_handler(func=lambda call: True)
 def on_callback(call):
+    lang = DEFAULT_LANG
     try:
         data = call.data
         chat_id = call.message.chat.id
+        lang = user_lang(call.from_user)
+        msg = bundle(lang)["msg"]
         bot.answer_callback_query(call.id)
 
         if data == "BACK_MAIN":
-            send_with_optional_photo(chat_id, "START", text_start(), reply_markup=kb_main())
+            send_with_optional_photo(chat_id, "START", text_start(lang), reply_markup=kb_main(lang))
             return
 
         if data == "PAY":
-            send_with_optional_photo(chat_id, "PAYMENT", text_payment(), reply_markup=kb_payment())
+            send_with_optional_photo(chat_id, "PAYMENT", text_payment(lang), reply_markup=kb_payment(lang))
+            return
+
+        if data == "LANG":
+            bot.send_message(chat_id, msg["lang_pick"], reply_markup=kb_lang())
+            return
+
+        if data.startswith("LANG|"):
+            new_lang = data.split("|", 1)[1]
+            if new_lang not in BUNDLES:
+                new_lang = DEFAULT_LANG
+            set_lang_pref(call.from_user.id, new_lang)
+            lang = new_lang
+            bot.send_message(chat_id, bundle(lang)["msg"]["lang_set"])
+            send_with_optional_photo(chat_id, "START", text_start(lang), reply_markup=kb_main(lang))
             return
 
         if data.startswith("CAT|"):
             cat_id = data.split("|", 1)[1]
-            text = category_message(cat_id)
+            text = category_message(cat_id, lang)
             img_key = f"CAT_{cat_id}"
-            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_category(cat_id))
+            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_category(cat_id, lang))
             return
 
         if data.startswith("ITEM|"):
             item_id = data.split("|", 1)[1]
             found = ITEM_BY_ID.get(item_id)
             if not found:
-                bot.send_message(chat_id, "❌ Sản phẩm không tồn tại.")
+                bot.send_message(chat_id, msg["no_item"])
                 return
             _, it = found
 
-            text = item_message(item_id)
+            text = item_message(item_id, lang)
 
             buy_text = build_buy_text(
                 call.from_user,
@@ -703,30 +2332,67 @@ def on_callback(call):
                 product=it["name"],
                 price=it["price"],
                 require_hint=it.get("require_hint", "..."),
+                lang=lang,
             )
             buy_url = build_prefilled_admin_link(buy_text)
 
             img_key = f"ITEM_{item_id}"
-            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_item(item_id, buy_url))
+            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_item(item_id, buy_url, lang))
+            return
+
+        if data.startswith("BUY|"):
+            item_id = data.split("|", 1)[1]
+            found = ITEM_BY_ID.get(item_id)
+            if not found:
+                bot.send_message(chat_id, msg["no_item"])
+                return
+            cat_id, it = found
+
+            held = reserve_stock(item_id, call.from_user.id, lang=lang)
+            if not held:
+                bot.send_message(
+                    chat_id,
+                    msg["sold_out"].format(name=bundle(lang)["items"][item_id]["name"]),
+                    parse_mode="Markdown",
+                    reply_markup=kb_category(cat_id, lang),
+                )
+                return
+            res_id, expires_at = held
+
+            buy_text = build_buy_text(
+                call.from_user,
+                group=it["group"],
+                product=it["name"],
+                price=it["price"],
+                require_hint=it.get("require_hint", "..."),
+                res_id=res_id,
+                lang=lang,
+            )
+            bot.send_message(
+                chat_id,
+                text_reserved(item_id, res_id, expires_at, lang),
+                parse_mode="Markdown",
+                reply_markup=kb_reserved(item_id, build_prefilled_admin_link(buy_text), lang),
+            )
             return
 
         if data.startswith("BACKCAT|"):
             item_id = data.split("|", 1)[1]
             found = ITEM_BY_ID.get(item_id)
             if not found:
-                send_with_optional_photo(chat_id, "START", text_start(), reply_markup=kb_main())
+                send_with_optional_photo(chat_id, "START", text_start(lang), reply_markup=kb_main(lang))
                 return
             cat_id, _ = found
-            text = category_message(cat_id)
+            text = category_message(cat_id, lang)
             img_key = f"CAT_{cat_id}"
-            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_category(cat_id))
+            send_with_optional_photo(chat_id, img_key, text, reply_markup=kb_category(cat_id, lang))
             return
 
-        bot.send_message(chat_id, "❓ Không hiểu thao tác. Gõ /start để bắt đầu lại.")
+        bot.send_message(chat_id, msg["unknown_action"])
 
     except Exception as e:
         try:
-            bot.send_message(call.message.chat.id, f"⚠️ Có lỗi nhỏ xảy ra.\nChi tiết: {e}")
+            bot.send_message(call.message.chat.id, bundle(lang)["msg"]["error"].format(e=e))
         except Exception:
             pass
 
@@ -754,11 +2420,101 @@ def log_ping():
         )
 
 
+# =========================
+# Update recorder (for bench/replay_updates.py)
+# Anonymized Update JSON, one {"t": ts, "update": {...}} per line, gzip.
+# Each flush appends one gzip member with a single O_APPEND write, so
+# several gunicorn workers can share the same file.
+# =========================
+# reply_markup/url: inline buttons carry the prefilled admin link (@username + order details)
+_ANON_DROP = {"phone_number", "bio", "contact", "location", "reply_markup", "url"}
+_ANON_MASK = {"first_name", "last_name", "title"}  # required by telebot types -> keep the key
+_ANON_ID_PARENTS = {"from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat"}
+
+
+def _anon_id(value: int) -> int:
+    digest = hashlib.sha256(f"{UPDATE_LOG_SALT}:{value}".encode()).hexdigest()
+    n = int(digest[:12], 16)
+    return -n if value < 0 else n
+
+
+def anonymize_update(obj, parent: str = ""):
+    if isinstance(obj, list):
+        return [anonymize_update(x, parent) for x in obj]
+    if not isinstance(obj, dict):
+        return obj
+    out = {}
+    for k, v in obj.items():
+        if k in _ANON_DROP:
+            continue
+        if k in _ANON_MASK and isinstance(v, str):
+            out[k] = "x"
+            continue
+        if k == "username" and isinstance(v, str):
+            out[k] = f"u{hashlib.sha256(f'{UPDATE_LOG_SALT}:{v}'.encode()).hexdigest()[:10]}"
+            continue
+        if k == "id" and parent in _ANON_ID_PARENTS and isinstance(v, int):
+            out[k] = _anon_id(v)
+        elif k in ("text", "caption") and isinstance(v, str):
+            # keep the size (entity offsets stay valid) and the command token only:
+            # arguments carry credentials (/vault) and real chat ids (/paid)
+            cmd = v.split(maxsplit=1)[0] if v.startswith("/") else ""
+            if cmd and len(v) > len(cmd):
+                cmd += " "  # replay still routes to the command handler
+            out[k] = cmd + "x" * (len(v) - len(cmd))
+        elif k == "file_name" and isinstance(v, str):
+            stem, ext = os.path.splitext(v)
+            out[k] = "x" * len(stem) + ext
+        else:
+            out[k] = anonymize_update(v, k)
+    return out
+
+
+class UpdateRecorder:
+    def __init__(self, path: str, flush_every: int = 50, flush_sec: float = 5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_sec = flush_sec
+        self._buf = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, raw: str):
+        line = json.dumps({"t": time.time(), "update": anonymize_update(json.loads(raw))}, ensure_ascii=False)
+        with self._lock:
+            self._buf.append(line)
+            due = len(self._buf) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_sec
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._buf = self._buf, []
+            self._last_flush = time.monotonic()
+        if not lines:
+            return
+        data = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+update_recorder = UpdateRecorder(UPDATE_LOG_PATH) if UPDATE_LOG_PATH else None
+
+
 # ✅ Telegram webhook endpoint
 @server.post("/webhook")
 def telegram_webhook():
     try:
         raw = request.get_data().decode("utf-8")
+        if update_recorder:
+            try:
+                update_recorder.record(raw)
+            except Exception as e:
+                print(f"[RECORDER] error: {e}")
         update = types.Update.de_json(raw)
         bot.process_new_updates([update])
         return "OK", 200
@@ -0,0 +1,75 @@
+"""
+Deliver N vault units end-to-end (enqueue -> claim -> send -> DONE).
+
+    python bench/delivery_throughput.py --units 10000 --per-order 1
+
+Telegram sends are replaced by an in-process recorder so the numbers are
+the bot's own overhead (SQLite claims + bookkeeping), not network time.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKU = "MB_13K"
+
+
+def _load_app(db_path: str):
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["DB_PATH"] = db_path
+    os.environ["STOCK_SWEEP_SEC"] = "0"
+    os.environ["DELIVERY_POLL_SEC"] = "0"
+    sys.path.insert(0, ROOT)
+    import app
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--units", type=int, default=10000)
+    ap.add_argument("--per-order", type=int, default=1)
+    opt = ap.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="delivery_bench_"), "bench.db")
+    app = _load_app(db_path)
+
+    sent = {"message": 0, "document": 0}
+    app.bot.send_message = lambda *a, **k: sent.__setitem__("message", sent["message"] + 1)
+    app.bot.send_document = lambda *a, **k: sent.__setitem__("document", sent["document"] + 1)
+
+    app.add_vault_units(SKU, [f"mb-{i:06d}|pass-{i:06d}" for i in range(opt.units)])
+    orders = opt.units // opt.per_order
+
+    t0 = time.perf_counter()
+    for i in range(orders):
+        app.enqueue_delivery(SKU, 100000 + i, opt.per_order)
+    t_enqueue = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    done = 0
+    while True:
+        n = app.process_deliveries(limit=500)
+        if not n:
+            break
+        done += n
+    t_deliver = time.perf_counter() - t0
+
+    counts = {(r["item_id"], r["status"]): r["n"] for r in app.vault_counts()}
+    delivered = counts.get((SKU, "DELIVERED"), 0)
+
+    print(f"units={opt.units} per_order={opt.per_order} orders={orders}")
+    print(f"enqueue: {t_enqueue:.3f}s ({orders / t_enqueue:.0f} orders/s)")
+    print(f"deliver: {t_deliver:.3f}s ({delivered / t_deliver:.0f} units/s, {done / t_deliver:.0f} orders/s)")
+    print(f"sends: {sent}")
+
+    if delivered != orders * opt.per_order:
+        print(f"FAIL: delivered {delivered} units")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
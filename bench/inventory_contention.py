@@ -0,0 +1,80 @@
+"""
+Many parallel buyers hammering one SKU.
+
+    python bench/inventory_contention.py --buyers 200 --procs 8 --stock 50
+
+Each process imports app.py against a throw-away SQLite file (like gunicorn
+workers sharing DB_PATH) and calls reserve_stock() for its share of buyers.
+Exits non-zero if the SKU is oversold or counters drift.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKU = "TELE_CLONE"
+
+
+def _load_app(db_path: str):
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["DB_PATH"] = db_path
+    os.environ["STOCK_SWEEP_SEC"] = "0"
+    sys.path.insert(0, ROOT)
+    import app
+
+    return app
+
+
+def _worker(args):
+    db_path, user_ids = args
+    app = _load_app(db_path)
+    won, lat = 0, []
+    for uid in user_ids:
+        t0 = time.perf_counter()
+        if app.reserve_stock(SKU, uid):
+            won += 1
+        lat.append(time.perf_counter() - t0)
+    return won, lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--buyers", type=int, default=200)
+    ap.add_argument("--procs", type=int, default=8)
+    ap.add_argument("--stock", type=int, default=50)
+    opt = ap.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="inv_bench_"), "bench.db")
+    app = _load_app(db_path)
+    app.set_stock(SKU, opt.stock)
+
+    chunks = [(db_path, list(range(i, opt.buyers, opt.procs))) for i in range(opt.procs)]
+    t0 = time.perf_counter()
+    with Pool(opt.procs) as pool:
+        results = pool.map(_worker, chunks)
+    elapsed = time.perf_counter() - t0
+
+    won = sum(r[0] for r in results)
+    lat = sorted(x for r in results for x in r[1])
+    row = [r for r in app.list_stock() if r["item_id"] == SKU][0]
+
+    def pct(p):
+        return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000
+
+    print(f"buyers={opt.buyers} procs={opt.procs} stock={opt.stock}")
+    print(f"reserved={won} available={row['available']} held={row['reserved']}")
+    print(f"elapsed={elapsed:.3f}s  throughput={opt.buyers / elapsed:.0f} req/s")
+    print(f"latency ms  p50={pct(0.50):.2f}  p95={pct(0.95):.2f}  p99={pct(0.99):.2f}")
+
+    expected = min(opt.stock, opt.buyers)
+    if won != expected or row["available"] != opt.stock - won or row["reserved"] != won:
+        print("FAIL: oversold or counters drifted")
+        sys.exit(1)
+    print("OK: no oversell")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cold (upload from MEDIA_DIR) vs warm (send by harvested file_id) photo sends.
+
+    python bench/media_send.py --keys 10 --size-kb 200 --warm 200 --latency-ms 60 --upload-kbps 8000
+
+Uses the fake Bot API from replay_updates.py with a simulated uplink
+(--upload-kbps), so request size turns into latency. Also fires
+--racers concurrent first sends at one fresh key and checks that only
+one upload happened (the others get the caption as text right away).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from replay_updates import ROOT, FakeTelegram, _pct
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keys", type=int, default=10)
+    ap.add_argument("--size-kb", type=int, default=200)
+    ap.add_argument("--warm", type=int, default=200, help="warm sends (spread over the keys)")
+    ap.add_argument("--racers", type=int, default=16)
+    ap.add_argument("--latency-ms", type=float, default=60.0)
+    ap.add_argument("--upload-kbps", type=float, default=8000.0)
+    opt = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="media_bench_")
+    media_dir = os.path.join(tmp, "media")
+    os.makedirs(media_dir)
+    keys = [f"ITEM_BENCH_{i}" for i in range(opt.keys)] + ["ITEM_RACE"]
+    for key in keys:
+        with open(os.path.join(media_dir, f"{key}.jpg"), "wb") as f:
+            f.write(os.urandom(opt.size_kb * 1024))
+
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["MEDIA_DIR"] = media_dir
+    os.environ["STOCK_SWEEP_SEC"] = "0"
+    os.environ["DELIVERY_POLL_SEC"] = "0"
+
+    fake = FakeTelegram(opt.latency_ms, 0, 0, 1, upload_kbps=opt.upload_kbps)
+    fake.start()
+    sys.path.insert(0, ROOT)
+    import app
+    from telebot import apihelper
+
+    apihelper.API_URL = f"http://127.0.0.1:{fake.port}/bot{{0}}/{{1}}"
+
+    def timed(key):
+        t0 = time.perf_counter()
+        app.send_with_optional_photo(1, key, "bench")
+        return time.perf_counter() - t0
+
+    def snapshot():
+        return fake.calls["sendPhoto"], fake.bytes_in["sendPhoto"]
+
+    c0, b0 = snapshot()
+    cold = [timed(k) for k in keys[:-1]]
+    c1, b1 = snapshot()
+    warm = [timed(keys[i % opt.keys]) for i in range(opt.warm)]
+    c2, b2 = snapshot()
+
+    # dedup: many first requests for one key at once
+    results = []
+    barrier = threading.Barrier(opt.racers)
+
+    def racer():
+        barrier.wait()
+        results.append(timed("ITEM_RACE"))
+
+    threads = [threading.Thread(target=racer) for _ in range(opt.racers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    c3, b3 = snapshot()
+    text_in_race = fake.calls["sendMessage"]
+    fake.stop()
+
+    big = opt.size_kb * 1024
+    uploads_in_race = round((b3 - b2) / big)  # file_id sends are tens of bytes
+
+    def row(name, lat, calls, nbytes):
+        return (f"{name:5s} sends={calls:4d}  bytes/send={nbytes / max(calls, 1):10.0f}  "
+                f"p50={_pct(lat, 0.5) * 1000:7.1f}ms  p99={_pct(lat, 0.99) * 1000:7.1f}ms")
+
+    print(f"image={opt.size_kb}KB latency={opt.latency_ms}ms uplink={opt.upload_kbps}kbps")
+    print(row("cold", cold, c1 - c0, b1 - b0))
+    print(row("warm", warm, c2 - c1, b2 - b1))
+    print(row("race", results, c3 - c2, b3 - b2) + f"  uploads={uploads_in_race} text={text_in_race}")
+    saved = 1 - (b2 - b1) / max(c2 - c1, 1) / max((b1 - b0) / max(c1 - c0, 1), 1)
+    print(f"warm sends move {saved:.2%} fewer bytes than cold sends")
+
+    if uploads_in_race != 1:
+        print("FAIL: concurrent first sends were not deduplicated")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Replay recorded (or synthetic) Updates against the Flask webhook.
+
+Record in production with UPDATE_LOG_PATH=updates.jsonl.gz (and a fixed UPDATE_LOG_SALT), then:
+
+    python bench/replay_updates.py updates.jsonl.gz --speed 10
+    python bench/replay_updates.py --synth 2000 --rate 50 --speed 0 --latency-ms 80 --rate-429 0.01
+
+The Telegram Bot API is replaced by a local HTTP fake (apihelper.API_URL)
+that records every call, adds --latency-ms (+/- --jitter-ms) and answers
+a --rate-429 share of calls with "429 Too Many Requests".
+
+--speed N replays N times faster than recorded; --speed 0 = as fast as
+possible. --concurrency is the number of in-flight webhook requests
+(gunicorn workers x threads in production).
+
+Reports throughput, webhook latency percentiles, schedule lag (when --speed > 0), outbound
+API calls per update and memory.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# =========================
+# Input
+# =========================
+def load_log(path: str):
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def synth_log(n: int, rate: float, users: int, seed: int):
+    """Menu-browsing traffic shaped like the real bot: /start, categories, items, pay."""
+    sys.path.insert(0, ROOT)
+    import app
+
+    rnd = random.Random(seed)
+    cat_ids = list(app.CAT_BY_ID)
+    item_ids = list(app.ITEM_BY_ID)
+    t = 1_700_000_000.0
+    records = []
+    for i in range(n):
+        t += rnd.expovariate(rate)
+        uid = 10_000 + rnd.randrange(users)
+        user = {"id": uid, "is_bot": False, "first_name": "u", "language_code": "vi"}
+        chat = {"id": uid, "type": "private"}
+        roll = rnd.random()
+        if roll < 0.2:
+            update = {
+                "update_id": i,
+                "message": {"message_id": i, "date": int(t), "chat": chat, "from": user, "text": "/start",
+                            "entities": [{"type": "bot_command", "offset": 0, "length": 6}]},
+            }
+        else:
+            if roll < 0.55:
+                data = f"CAT|{rnd.choice(cat_ids)}"
+            elif roll < 0.85:
+                data = f"ITEM|{rnd.choice(item_ids)}"
+            elif roll < 0.95:
+                data = "PAY"
+            else:
+                data = f"BACKCAT|{rnd.choice(item_ids)}"
+            update = {
+                "update_id": i,
+                "callback_query": {
+                    "id": str(i), "from": user, "chat_instance": "0", "data": data,
+                    "message": {"message_id": i, "date": int(t), "chat": chat, "text": "x"},
+                },
+            }
+        records.append({"t": t, "update": update})
+    return records
+
+
+# =========================
+# Fake Telegram Bot API
+# =========================
+class FakeTelegram:
+    def __init__(self, latency_ms: float, jitter_ms: float, rate_429: float, seed: int, upload_kbps: float = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_429 = rate_429
+        self.upload_bps = upload_kbps * 1000 / 8  # 0 = request size costs nothing
+        self.rnd = random.Random(seed)
+        self.calls = Counter()
+        self.bytes_in = Counter()
+        self.throttled = Counter()
+        self.lock = threading.Lock()
+        self._msg_id = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                method = url.path.rstrip("/").rsplit("/", 1)[-1]
+                # telebot sends params in the query string, files as multipart body
+                status, payload = fake.handle(method, url.query.encode() + b"&" + body)
+                out = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128  # default 5 drops SYNs under bursts -> 1s retransmit stalls
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def handle(self, method: str, body: bytes):
+        with self.lock:
+            self.calls[method] += 1
+            self.bytes_in[method] += len(body)
+            throttle = self.rnd.random() < self.rate_429
+            delay = max(0.0, self.latency + self.rnd.uniform(-self.jitter, self.jitter))
+            self._msg_id += 1
+            msg_id = self._msg_id
+        if self.upload_bps:
+            delay += len(body) / self.upload_bps
+        if delay:
+            time.sleep(delay)
+        if throttle:
+            with self.lock:
+                self.throttled[method] += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": "Too Many Requests: retry after 1", "parameters": {"retry_after": 1},
+            }
+
+        m = re.search(rb'chat_id(?:=|"\r\n\r\n)(-?\d+)', body)
+        chat_id = int(m.group(1)) if m else 1
+        message = {"message_id": msg_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": f"P{msg_id}", "file_unique_id": f"p{msg_id}", "width": 1, "height": 1}]
+        elif method == "sendDocument":
+            message["document"] = {"file_id": f"D{msg_id}", "file_unique_id": f"d{msg_id}"}
+        elif method == "getFile":
+            return 200, {"ok": True, "result": {"file_id": "F", "file_unique_id": "f", "file_path": "f.bin"}}
+        elif not method.startswith(("send", "copy", "forward")):
+            return 200, {"ok": True, "result": True}
+        return 200, {"ok": True, "result": message}
+
+
+# =========================
+# Replay
+# =========================
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("log", nargs="?", help="gzip JSON-lines log written by UPDATE_LOG_PATH")
+    ap.add_argument("--synth", type=int, default=0, help="generate N synthetic updates instead of a log")
+    ap.add_argument("--rate", type=float, default=20.0, help="synthetic arrival rate (updates/s)")
+    ap.add_argument("--users", type=int, default=200, help="synthetic distinct users")
+    ap.add_argument("--save", help="write the synthetic updates to this log path")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier; 0 = max")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--tracemalloc", action="store_true", help="also report Python heap peak (slower)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    opt = ap.parse_args()
+
+    os.environ.setdefault("BOT_TOKEN", "0:bench")
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="replay_"), "bench.db")
+    os.environ["STOCK_SWEEP_SEC"] = "0"
+    os.environ["DELIVERY_POLL_SEC"] = "0"
+    os.environ.pop("UPDATE_LOG_PATH", None)
+
+    if opt.synth:
+        records = synth_log(opt.synth, opt.rate, opt.users, opt.seed)
+        if opt.save:
+            with gzip.open(opt.save, "wt", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    elif opt.log:
+        records = load_log(opt.log)
+    else:
+        ap.error("give a log path or --synth N")
+    if not records:
+        ap.error("no updates to replay")
+
+    fake = FakeTelegram(opt.latency_ms, opt.jitter_ms, opt.rate_429, opt.seed)
+    fake.start()
+
+    rss_before = _rss_mb()
+    if opt.tracemalloc:
+        tracemalloc.start()
+
+    sys.path.insert(0, ROOT)
+    import app
+    from telebot import apihelper
+
+    apihelper.API_URL = f"http://127.0.0.1:{fake.port}/bot{{0}}/{{1}}"
+    apihelper.FILE_URL = f"http://127.0.0.1:{fake.port}/file/bot{{0}}/{{1}}"
+
+    per_thread = threading.local()
+    real_make_request = apihelper._make_request
+
+    def counting_make_request(*args, **kwargs):
+        per_thread.calls = getattr(per_thread, "calls", 0) + 1
+        return real_make_request(*args, **kwargs)
+
+    apihelper._make_request = counting_make_request
+
+    latencies, lags, calls_per_update = [], [], []
+    results_lock = threading.Lock()
+    clients = threading.local()
+
+    def post(body: bytes, due: float):
+        client = getattr(clients, "c", None)
+        if client is None:
+            client = clients.c = app.server.test_client()
+        per_thread.calls = 0
+        t0 = time.perf_counter()
+        client.post("/webhook", data=body, content_type="application/json")
+        dt = time.perf_counter() - t0
+        with results_lock:
+            latencies.append(dt)
+            lags.append(max(0.0, t0 - due))
+            calls_per_update.append(per_thread.calls)
+
+    t_first = records[0]["t"]
+    bodies = [(json.dumps(r["update"]).encode("utf-8"), r["t"] - t_first) for r in records]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=opt.concurrency) as pool:
+        for body, offset in bodies:
+            due = start + (offset / opt.speed if opt.speed > 0 else 0.0)
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(post, body, due)
+    elapsed = time.perf_counter() - start
+
+    heap_peak = tracemalloc.get_traced_memory()[1] / 1e6 if opt.tracemalloc else None
+    fake.stop()
+
+    n = len(latencies)
+    report = {
+        "updates": n,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ups": round(n / elapsed, 1),
+        "recorded_span_s": round(records[-1]["t"] - t_first, 3),
+        "speed": opt.speed,
+        "concurrency": opt.concurrency,
+        "latency_ms": {p: round(_pct(latencies, q) * 1000, 2)
+                       for p, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+        "outbound_calls": dict(fake.calls.most_common()),
+        "outbound_429": dict(fake.throttled.most_common()),
+        "calls_per_update": {
+            "mean": round(sum(calls_per_update) / n, 2),
+            "p99": _pct(calls_per_update, 0.99),
+            "max": max(calls_per_update),
+        },
+        "rss_mb": {"before_import": round(rss_before, 1), "after": round(_rss_mb(), 1),
+                   # ru_maxrss is KiB on Linux
+                   "max": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6, 1)},
+    }
+    if opt.speed > 0:
+        # with --speed 0 every update is due at start, so lag would only measure queue drain time
+        report["schedule_lag_ms_p99"] = round(_pct(lags, 0.99) * 1000, 2)
+    if heap_peak is not None:
+        report["python_heap_peak_mb"] = round(heap_peak, 1)
+
+    if opt.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print(f"updates={n} elapsed={report['elapsed_s']}s throughput={report['throughput_ups']} upd/s "
+          f"(recorded span {report['recorded_span_s']}s, speed={opt.speed}, concurrency={opt.concurrency})")
+    print("latency ms  " + "  ".join(f"{k}={v}" for k, v in report["latency_ms"].items())
+          + (f"  | schedule lag p99={report['schedule_lag_ms_p99']}" if opt.speed > 0 else ""))
+    print(f"calls/update mean={report['calls_per_update']['mean']} p99={report['calls_per_update']['p99']} "
+          f"max={report['calls_per_update']['max']}")
+    print(f"outbound: {report['outbound_calls']}")
+    if report["outbound_429"]:
+        print(f"429s: {report['outbound_429']}")
+    print(f"rss MB: {report['rss_mb']}" + (f"  heap peak MB: {heap_peak:.1f}" if heap_peak is not None else ""))
+
+
+if __name__ == "__main__":
+    main()